@@ -0,0 +1,75 @@
+"""Redirect host checks against a large allowlist, linear scan vs compiled trie.
+
+    python benchmarks/bench_hosts.py [hosts] [iterations]
+
+Half of the patterns are exact hosts, half `.domain` ones (the domain and its subdomains),
+as in `ALLOWED_CLIENT_HOSTS`. The linear side is what `validate_storefront_url` and
+`social_core.utils.sanitize_redirect` do per call.
+"""
+import os
+import random
+import string
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from django.conf import settings
+
+settings.configure()
+
+from django.http.request import validate_host
+from social_core.utils import sanitize_redirect as social_core_sanitize_redirect
+
+from social_auth.hosts import get_host_matcher, sanitize_redirect
+
+REQUEST_HOST = 'api.example.com'
+
+
+def make_patterns(count: int, seed: int = 42):
+    rng = random.Random(seed)
+    patterns = []
+    for index in range(count):
+        name = ''.join(rng.choice(string.ascii_lowercase) for _ in range(10))
+        domain = f'{name}.{rng.choice(("com", "shop", "store", "co.uk"))}'
+        patterns.append(f'.{domain}' if index % 2 else f'www.{domain}')
+    return patterns
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    number = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    patterns = make_patterns(count)
+
+    start = time.perf_counter()
+    matcher = get_host_matcher(patterns)
+    print(f'{count} hosts compiled in {(time.perf_counter() - start) * 1000:.1f} ms')
+
+    cases = {
+        # worst case for the scan, the match is at the end of the list
+        'last exact': patterns[-2],
+        'subdomain': 'shop.eu' + patterns[-1],
+        'miss': 'evil.example.net',
+    }
+    for case, host in cases.items():
+        assert matcher.match_host(host) == validate_host(host, patterns), case
+        linear = min(timeit.repeat(lambda: validate_host(host, patterns), number=max(number // 100, 1), repeat=3))
+        linear /= max(number // 100, 1)
+        trie = min(timeit.repeat(lambda: get_host_matcher(patterns).match_host(host), number=number, repeat=5)) / number
+        print(f'  host {case:>10}: linear {linear * 1e6:10.2f} us, trie {trie * 1e6:6.2f} us, x{linear / trie:,.0f}')
+
+    hosts = patterns[::2]
+    url = f'https://{hosts[-1]}/account/'
+    redirect_hosts = hosts + [REQUEST_HOST]
+    linear = min(timeit.repeat(
+        lambda: social_core_sanitize_redirect(hosts + [REQUEST_HOST], url), number=max(number // 10, 1), repeat=3,
+    )) / max(number // 10, 1)
+    trie = min(timeit.repeat(
+        lambda: sanitize_redirect(get_host_matcher(redirect_hosts), REQUEST_HOST, url), number=number, repeat=5,
+    )) / number
+    print(f'  sanitize_redirect: linear {linear * 1e6:10.2f} us, trie {trie * 1e6:6.2f} us, x{linear / trie:,.0f}')
+
+
+if __name__ == '__main__':
+    main()
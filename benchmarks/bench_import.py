@@ -0,0 +1,129 @@
+"""Boot and import time of the plugin, parsed from `python -X importtime`.
+
+Run it from a Saleor checkout that has `social_auth` in INSTALLED_APPS:
+
+    DJANGO_SETTINGS_MODULE=saleor.settings python /path/to/benchmarks/bench_import.py \\
+        --repeat 5 --top 15 --output results.json [--compare baseline.json]
+
+Every run is a fresh interpreter. Reported (median of the runs): `django.setup()` (boot, which
+includes `SocialAuthConfig`), the import of `--module` on top of the booted project (what
+saleor's plugin discovery pays) and the slowest modules it pulled in, by self time.
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MARKER = '-- social_auth bench_import setup done --'
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+PROBE = '''
+import json, sys, time
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+import django
+django.setup()
+setup_done = time.perf_counter()
+sys.stderr.write({marker!r} + '\\n')
+import {module}
+done = time.perf_counter()
+print(json.dumps({{'setup_ms': (setup_done - start) * 1000, 'import_ms': (done - setup_done) * 1000}}))
+'''
+
+
+def parse_importtime(stderr: str):
+    """`(name, self_us, cumulative_us, depth)` of the imports after the marker line."""
+    _, _, after = stderr.partition(MARKER)
+    entries = []
+    for line in after.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append((name, int(self_us), int(cumulative_us), len(indent) // 2))
+    return entries
+
+
+def run_once(module: str) -> dict:
+    code = PROBE.format(root=ROOT, marker=MARKER, module=module)
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        capture_output=True, text=True, env=os.environ.copy(),
+    )
+    if process.returncode:
+        raise SystemExit(process.stderr[-2000:])
+    result = json.loads(process.stdout.strip().splitlines()[-1])
+    result['modules'] = parse_importtime(process.stderr)
+    return result
+
+
+def run(module: str, repeat: int, top: int) -> dict:
+    runs = [run_once(module) for _ in range(repeat)]
+    self_times = {}
+    for result in runs:
+        for name, self_us, _, _ in result['modules']:
+            self_times.setdefault(name, []).append(self_us)
+    slowest = sorted(
+        ((name, statistics.median(values) / 1000) for name, values in self_times.items()),
+        key=lambda item: item[1], reverse=True,
+    )[:top]
+    return {
+        'module': module,
+        'python': platform.python_version(),
+        'repeat': repeat,
+        'setup_ms': statistics.median(result['setup_ms'] for result in runs),
+        'import_ms': statistics.median(result['import_ms'] for result in runs),
+        'modules_imported': statistics.median(len(result['modules']) for result in runs),
+        'slowest': [{'module': name, 'self_ms': ms} for name, ms in slowest],
+    }
+
+
+def report(result: dict):
+    print(f"{result['module']}, python {result['python']}, median of {result['repeat']} runs")
+    print(f"  django.setup(): {result['setup_ms']:9.1f} ms")
+    print(f"  import module:  {result['import_ms']:9.1f} ms, {result['modules_imported']:.0f} new modules")
+    for item in result['slowest']:
+        print(f"    {item['self_ms']:8.2f} ms  {item['module']}")
+
+
+def compare(result: dict, baseline: dict, threshold: float) -> bool:
+    regressed = False
+    for key in ('setup_ms', 'import_ms'):
+        before, after = baseline[key], result[key]
+        change = (after - before) / before if before else 0
+        flag = ''
+        if change > threshold:
+            flag = '  REGRESSION'
+            regressed = True
+        print(f'  {key}: {before:.1f} -> {after:.1f} ms ({change:+.0%}){flag}')
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--module', default='social_auth.plugin')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--output', help='write the results as json')
+    parser.add_argument('--compare', help='results json of a previous run')
+    parser.add_argument('--threshold', type=float, default=0.2, help='slow down reported as regression')
+    options = parser.parse_args()
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'saleor.settings')
+
+    result = run(options.module, options.repeat, options.top)
+    report(result)
+    if options.output:
+        with open(options.output, 'w') as output:
+            json.dump(result, output, indent=2)
+    if options.compare:
+        with open(options.compare) as baseline:
+            if compare(result, json.load(baseline), options.threshold):
+                sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,398 @@
+"""End to end benchmark of SocialAuthPlugin's external hooks against local stubs.
+
+Run it from a Saleor checkout that has `social_auth` in INSTALLED_APPS,
+a throwaway test database (SQLite or Postgres, as configured) is created and dropped:
+
+    DJANGO_SETTINGS_MODULE=saleor.settings python /path/to/benchmarks/bench_login.py \\
+        --logins 200 --concurrency 1,4,16 --output results.json [--compare baseline.json]
+
+The provider side is served in-process: a generic OAuth2 provider (authorize/token/userinfo),
+an OpenID Connect provider (discovery document, JWKS, RS256 signed id_tokens checked against
+the nonce of the authorization url) and a `jscode2session` endpoint for `WeappAuth`.
+Reported per hook and concurrency level:
+p50/p99 latency, throughput, and queries per call (measured on a serial pass).
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'saleor.settings')
+
+import django
+
+django.setup()
+
+import jwt
+import yaml
+from cryptography.hazmat.primitives.asymmetric import rsa
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.db import connection, connections
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from social_core.backends.oauth import BaseOAuth2
+from social_core.backends.open_id_connect import OpenIdConnectAuth
+
+from social_auth import (
+    CONFIG_CODE,
+    DEFAULT_BACKEND_CODE,
+    SOCIAL_STORAGE_CODE,
+    SOCIAL_STRATEGY_CODE,
+    STATE_STORE_CODE,
+)
+from social_auth.backends.weapp import WeappAuth
+from social_auth.plugin import SocialAuthPlugin
+
+STOREFRONT_URL = 'http://localhost:3000/'
+STUB = {'base_url': ''}
+
+OIDC_CLIENT_ID = 'stub-oidc-key'
+OIDC_KID = 'stub-key-1'
+OIDC_SIGNING_KEY = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+OIDC_JWK = {
+    **json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(OIDC_SIGNING_KEY.public_key())),
+    'kid': OIDC_KID, 'alg': 'RS256', 'use': 'sig',
+}
+
+
+class StubProviderHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # headers & body are two writes, with Nagle and delayed ACKs each keep-alive
+    # request would wait ~40 ms on the loopback
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, body: dict, max_age: int = None):
+        content = json.dumps(body).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        if max_age is not None:
+            self.send_header('Cache-Control', f'public, max-age={max_age}')
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        if url.path == '/sns/jscode2session':
+            # `u<index>-<n>`, the same index is the same (returning) user
+            openid = 'o' + query.get('js_code', '').split('-', 1)[0]
+            self.reply({'openid': openid, 'session_key': f'sk-{time.monotonic_ns()}'})
+        elif url.path == '/userinfo':
+            user_id = query.get('access_token', '').split('-', 1)[0]
+            self.reply({'id': user_id, 'email': f'{user_id}@stub-oauth2.test'})
+        elif url.path == '/oidc/.well-known/openid-configuration':
+            issuer = STUB['base_url'] + '/oidc'
+            self.reply({
+                'issuer': issuer,
+                'authorization_endpoint': issuer + '/authorize',
+                'token_endpoint': issuer + '/token',
+                'userinfo_endpoint': issuer + '/userinfo',
+                'jwks_uri': issuer + '/jwks',
+                'token_endpoint_auth_methods_supported': ['client_secret_post'],
+                'id_token_signing_alg_values_supported': ['RS256'],
+            }, max_age=3600)
+        elif url.path == '/oidc/jwks':
+            self.reply({'keys': [OIDC_JWK]}, max_age=3600)
+        elif url.path == '/oidc/userinfo':
+            user_id = self.headers.get('Authorization', '').rsplit(' ', 1)[-1].split('-', 1)[0]
+            self.reply({'sub': user_id, 'email': f'{user_id}@stub-oidc.test', 'preferred_username': user_id})
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        form = {key: values[0] for key, values in parse_qs(self.rfile.read(length).decode('utf-8')).items()}
+        path = urlparse(self.path).path
+        if path == '/token':
+            self.reply({'access_token': form.get('code', ''), 'token_type': 'bearer'})
+        elif path == '/oidc/token':
+            # `<code>~<nonce>`, the nonce of the authorization url goes back in the id_token
+            code, _, nonce = form.get('code', '').partition('~')
+            user_id = code.split('-', 1)[0]
+            now = int(time.time())
+            id_token = jwt.encode(
+                {
+                    'iss': STUB['base_url'] + '/oidc', 'aud': OIDC_CLIENT_ID, 'sub': user_id,
+                    'email': f'{user_id}@stub-oidc.test', 'iat': now, 'exp': now + 300, 'nonce': nonce,
+                },
+                OIDC_SIGNING_KEY, algorithm='RS256', headers={'kid': OIDC_KID},
+            )
+            self.reply({'access_token': code, 'token_type': 'bearer', 'id_token': id_token})
+        else:
+            self.send_error(404)
+
+
+class StubOAuth2(BaseOAuth2):
+    name = 'stub-oauth2'
+    ACCESS_TOKEN_METHOD = 'POST'
+    REDIRECT_STATE = False
+
+    def authorization_url(self):
+        return STUB['base_url'] + '/authorize'
+
+    def access_token_url(self):
+        return STUB['base_url'] + '/token'
+
+    def get_user_details(self, response):
+        return {'username': response.get('email'), 'email': response.get('email')}
+
+    def get_user_id(self, details, response):
+        return details.get('email')
+
+    def user_data(self, access_token, *args, **kwargs):
+        return self.get_json(STUB['base_url'] + '/userinfo', params={'access_token': access_token})
+
+
+class StubOIDC(OpenIdConnectAuth):
+    name = 'stub-oidc'
+
+    def oidc_endpoint(self):
+        return STUB['base_url'] + '/oidc'
+
+    def get_user_id(self, details, response):
+        return details.get('email')
+
+
+class StubWeappAuth(WeappAuth):
+
+    def access_token_url(self):
+        return STUB['base_url'] + '/sns/jscode2session'
+
+
+def start_stub_provider():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubProviderHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name='stub-provider').start()
+    STUB['base_url'] = f'http://127.0.0.1:{server.server_port}'
+    return server
+
+
+def build_plugin(state_store):
+    social_auth_config = {
+        'SOCIAL_AUTH_AUTHENTICATION_BACKENDS': [
+            f'{__name__}.StubOAuth2',
+            f'{__name__}.StubOIDC',
+            f'{__name__}.StubWeappAuth',
+        ],
+        'SOCIAL_AUTH_STUB_OAUTH2_KEY': 'stub-key',
+        'SOCIAL_AUTH_STUB_OAUTH2_SECRET': 'stub-secret',
+        'SOCIAL_AUTH_STUB_OIDC_KEY': OIDC_CLIENT_ID,
+        'SOCIAL_AUTH_STUB_OIDC_SECRET': 'stub-secret',
+        'SOCIAL_AUTH_WEIXIN_WEAPP_KEY': 'stub-appid',
+        'SOCIAL_AUTH_WEIXIN_WEAPP_SECRET': 'stub-secret',
+    }
+    configuration = [
+        {'name': SOCIAL_STRATEGY_CODE, 'value': 'social_auth.strategy.SaleorPluginStrategy'},
+        {'name': SOCIAL_STORAGE_CODE, 'value': 'social_django.models.DjangoStorage'},
+        {'name': STATE_STORE_CODE, 'value': state_store},
+        {'name': DEFAULT_BACKEND_CODE, 'value': 'weixin-weapp'},
+        {'name': CONFIG_CODE, 'value': yaml.safe_dump(social_auth_config)},
+    ]
+    return SocialAuthPlugin(configuration=configuration, active=True)
+
+
+def new_request():
+    request = RequestFactory().post('/graphql/')
+    request.user = AnonymousUser()
+    return request
+
+
+class Flow:
+    """One call per hook, in the order a client does them."""
+
+    def __init__(self, plugin, users: int):
+        self.plugin = plugin
+        self.users = users
+        self.counter = 0
+        self.lock = threading.Lock()
+
+    def next_code(self):
+        with self.lock:
+            self.counter += 1
+            return f'u{self.counter % self.users}-{self.counter}'
+
+    def authentication_url(self, backend='stub-oauth2'):
+        data = {'backend': backend, 'redirectUri': STOREFRONT_URL}
+        result = self.plugin.external_authentication_url(data, new_request(), None)
+        return {name: values[0] for name, values in parse_qs(urlparse(result['authorizationUrl']).query).items()}
+
+    def obtain_oauth2(self, query):
+        data = {'backend': 'stub-oauth2', 'code': self.next_code(), 'state': query['state']}
+        return self.plugin.external_obtain_access_tokens(data, new_request(), None)
+
+    def obtain_oidc(self, query):
+        # discovery document & JWKS from the cache, the id_token signature checked on every login
+        data = {'backend': 'stub-oidc', 'code': f"{self.next_code()}~{query['nonce']}", 'state': query['state']}
+        return self.plugin.external_obtain_access_tokens(data, new_request(), None)
+
+    def obtain_weapp(self):
+        data = {'backend': 'weixin-weapp', 'code': self.next_code(), 'state': ''}
+        return self.plugin.external_obtain_access_tokens(data, new_request(), None)
+
+    def refresh(self, tokens):
+        return self.plugin.external_refresh({'refreshToken': tokens.refresh_token}, new_request(), None)
+
+    def verify(self, tokens):
+        return self.plugin.external_verify({'token': tokens.token}, new_request(), None)
+
+    def run(self, timings: dict):
+        def timed(name, func, *args):
+            start = time.perf_counter()
+            result = func(*args)
+            timings.setdefault(name, []).append((time.perf_counter() - start) * 1000)
+            return result
+
+        query = timed('external_authentication_url', self.authentication_url)
+        timed('external_obtain_access_tokens[oauth2]', self.obtain_oauth2, query)
+        query = timed('external_authentication_url[oidc]', self.authentication_url, 'stub-oidc')
+        timed('external_obtain_access_tokens[oidc]', self.obtain_oidc, query)
+        tokens = timed('external_obtain_access_tokens[weapp]', self.obtain_weapp)
+        timed('external_refresh', self.refresh, tokens)
+        timed('external_verify', self.verify, tokens)
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, int(round(fraction * (len(values) - 1)))))
+    return values[index]
+
+
+def count_queries(flow: Flow, rounds: int) -> dict:
+    queries = {}
+
+    def captured(name, func, *args):
+        with CaptureQueriesContext(connection) as context:
+            result = func(*args)
+        queries.setdefault(name, []).append(len(context))
+        return result
+
+    for _ in range(rounds):
+        query = captured('external_authentication_url', flow.authentication_url)
+        captured('external_obtain_access_tokens[oauth2]', flow.obtain_oauth2, query)
+        query = captured('external_authentication_url[oidc]', flow.authentication_url, 'stub-oidc')
+        captured('external_obtain_access_tokens[oidc]', flow.obtain_oidc, query)
+        tokens = captured('external_obtain_access_tokens[weapp]', flow.obtain_weapp)
+        captured('external_refresh', flow.refresh, tokens)
+        captured('external_verify', flow.verify, tokens)
+    return {name: statistics.mean(values) for name, values in queries.items()}
+
+
+def run_level(flow: Flow, logins: int, concurrency: int) -> dict:
+    timings = {}
+
+    def worker(_):
+        try:
+            flow.run(timings)
+        finally:
+            connections.close_all()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(worker, range(logins)))
+    elapsed = time.perf_counter() - start
+    return {
+        name: {
+            'count': len(values),
+            'p50_ms': round(percentile(values, 0.50), 3),
+            'p99_ms': round(percentile(values, 0.99), 3),
+            'mean_ms': round(statistics.mean(values), 3),
+        }
+        for name, values in timings.items()
+    }, round(logins / elapsed, 2)
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL,
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: dict, baseline_path: str, threshold: float) -> bool:
+    with open(baseline_path) as baseline_file:
+        baseline = json.load(baseline_file)
+    previous = {(row['concurrency'], row['hook']): row for row in baseline['results']}
+    regressed = False
+    for row in results['results']:
+        before = previous.get((row['concurrency'], row['hook']))
+        if not before or not before['p50_ms']:
+            continue
+        change = row['p50_ms'] / before['p50_ms'] - 1
+        flag = ''
+        if change > threshold:
+            flag, regressed = '  REGRESSION', True
+        print(f"c={row['concurrency']:<3} {row['hook']:<40} p50 {before['p50_ms']:>9.3f} -> "
+              f"{row['p50_ms']:>9.3f} ms ({change:+.1%}){flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--logins', type=int, default=200, help='full flows per concurrency level')
+    parser.add_argument('--concurrency', default='1,4,16', help='comma separated thread counts')
+    parser.add_argument('--users', type=int, default=50, help='distinct provider users, the rest are returning logins')
+    parser.add_argument('--state-store', default='social_auth.state.CacheStateStore')
+    parser.add_argument('--query-rounds', type=int, default=5)
+    parser.add_argument('--output', help='write the results as json')
+    parser.add_argument('--compare', help='results json of a previous run')
+    parser.add_argument('--threshold', type=float, default=0.2, help='p50 slow down reported as regression')
+    options = parser.parse_args()
+
+    settings.ALLOWED_CLIENT_HOSTS = list(getattr(settings, 'ALLOWED_CLIENT_HOSTS', [])) + ['localhost']
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    server = start_stub_provider()
+    try:
+        flow = Flow(build_plugin(options.state_store), options.users)
+        # warm up: imports, registries, pools and the first (new) users
+        run_level(flow, min(options.users, options.logins), 1)
+        queries = count_queries(flow, options.query_rounds)
+
+        results = {
+            'meta': {
+                'revision': git_revision(),
+                'python': platform.python_version(),
+                'database': connection.vendor,
+                'state_store': options.state_store,
+                'logins': options.logins,
+                'users': options.users,
+            },
+            'results': [],
+        }
+        for concurrency in [int(level) for level in options.concurrency.split(',')]:
+            hooks, throughput = run_level(flow, options.logins, concurrency)
+            print(f'concurrency {concurrency}: {throughput} logins/s')
+            for hook, row in hooks.items():
+                row.update(hook=hook, concurrency=concurrency, throughput=throughput, queries=queries.get(hook))
+                results['results'].append(row)
+                print(f"  {hook:<40} p50 {row['p50_ms']:>9.3f} ms  p99 {row['p99_ms']:>9.3f} ms  "
+                      f"queries {row['queries']}")
+    finally:
+        server.shutdown()
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    if options.output:
+        with open(options.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+    if options.compare and compare(results, options.compare, options.threshold):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""Per-call cost of strategy/backend loading, dynamic vs prebuilt registry.
+
+    python benchmarks/bench_registry.py [iterations]
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import django
+from django.conf import settings
+
+settings.configure(
+    INSTALLED_APPS=[
+        'django.contrib.auth',
+        'django.contrib.contenttypes',
+        'django.contrib.sessions',
+        'social_django',
+    ],
+    DATABASES={'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}},
+)
+django.setup()
+
+from social_core.utils import get_strategy
+
+from social_auth.registry import Registry
+
+STRATEGY = 'social_auth.strategy.SaleorPluginStrategy'
+STORAGE = 'social_django.models.DjangoStorage'
+SETTINGS = {
+    'SOCIAL_AUTH_AUTHENTICATION_BACKENDS': [
+        'social_core.backends.google_openidconnect.GoogleOpenIdConnect',
+        'social_core.backends.github.GithubOAuth2',
+        'social_auth.backends.weapp.WeappAuth',
+    ],
+}
+BACKEND = 'weixin-weapp'
+REQUEST_DATA = {'code': 'xxx'}
+
+
+def dynamic():
+    strategy = get_strategy(STRATEGY, STORAGE, SETTINGS, REQUEST_DATA, request=None)
+    return strategy.get_backend(BACKEND, redirect_uri=None)
+
+
+registry = Registry(STRATEGY, STORAGE, SETTINGS['SOCIAL_AUTH_AUTHENTICATION_BACKENDS'])
+
+
+def prebuilt():
+    strategy = registry.get_strategy(SETTINGS, REQUEST_DATA, request=None)
+    return registry.get_backend(strategy, BACKEND, redirect_uri=None)
+
+
+if __name__ == '__main__':
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    for name, func in (('dynamic', dynamic), ('prebuilt', prebuilt)):
+        best = min(timeit.repeat(func, number=number, repeat=5))
+        print(f'{name:>10}: {best / number * 1e6:8.2f} us/call')
@@ -9,10 +9,15 @@ social_core_extras_require={
     'openidconnect': ['python-jose>=3.0.0'],
     'saml': ['python3-saml>=1.2.1'],
     'azuread': ['cryptography>=2.1.1'],
+    # `social_auth.backends.alipay`
+    'alipay': ['cryptography>=2.1.1'],
+    # async hooks, `social_auth.aio`
+    'async': ['httpx>=0.23.0'],
     'all': [
         'python-jose>=3.0.0', 
         'python3-saml>=1.2.1', 
         'cryptography>=2.1.1',
+        'httpx>=0.23.0',
     ]
 }
 
@@ -36,7 +41,12 @@ setup(
         "Programming Language :: Python :: 3.9",
         "Operating System :: OS Independent",
     ],
-    packages=["social_auth"],
+    packages=[
+        "social_auth",
+        "social_auth.backends",
+        "social_auth.management",
+        "social_auth.management.commands",
+    ],
     package_dir={"social_auth": "social_auth"},
     install_requires=install_requires,
     extras_require=social_core_extras_require,
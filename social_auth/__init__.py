@@ -3,3 +3,6 @@ DEFAULT_BACKEND_CODE = 'default_backend'
 SOCIAL_STRATEGY_CODE = 'social_strategy'
 SOCIAL_STORAGE_CODE = 'social_storage'
 EXCHANGE_REDIRECT_URI_CODE = 'exchange_redirect_uri'
+STATE_STORE_CODE = 'state_store'
+
+DEFAULT_STATE_STORE = 'social_auth.state.DBStateStore'
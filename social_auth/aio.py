@@ -0,0 +1,220 @@
+import asyncio
+import functools
+import logging
+import threading
+import time
+import weakref
+from http.cookiejar import DefaultCookiePolicy
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from requests import HTTPError
+from social_core.backends.oauth import BaseOAuth2
+from social_core.exceptions import AuthCanceled, AuthFailed, AuthForbidden, AuthUnreachableProvider
+from social_core.utils import user_agent
+
+from . import metrics
+from .http_pool import DEFAULT_MAX_RETRIES, DEFAULT_POOL_SIZE
+
+logger = logging.getLogger(__name__)
+
+# an httpx client is bound to the event loop it was first used on
+_clients = weakref.WeakKeyDictionary()
+_clients_lock = threading.Lock()
+
+
+def run_sync(func, *args, **kwargs):
+    """Await blocking code (ORM, pipeline) in the thread pool.
+
+    Not `thread_sensitive` as `sync_to_async` is by default, concurrent logins
+    would otherwise queue up on a single thread. Any pool thread may run it, so
+    its database connections are dealt with as around a request: stale ones closed
+    before, the ones past `CONN_MAX_AGE` (all by default) closed after.
+    """
+    return sync_to_async(_closing_old_connections(func), thread_sensitive=False)(*args, **kwargs)
+
+
+def _closing_old_connections(func):
+    @functools.wraps(func)
+    def inner(*args, **kwargs):
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    return inner
+
+
+def get_async_client(pool_size: int = DEFAULT_POOL_SIZE, max_retries: int = DEFAULT_MAX_RETRIES):
+    """Keep-alive `httpx.AsyncClient` of the running event loop, one per pool setup."""
+    # optional, `pip install saleor-social-auth[async]`
+    import httpx
+
+    loop = asyncio.get_running_loop()
+    key = (pool_size, max_retries)
+    with _clients_lock:
+        clients = _clients.setdefault(loop, {})
+        client = clients.get(key)
+        if client is None:
+            # httpx only retries failed connects, an authorization code is single use
+            transport = httpx.AsyncHTTPTransport(
+                limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+                retries=max_retries,
+            )
+            client = clients[key] = httpx.AsyncClient(transport=transport)
+            # shared by every login, never carry provider cookies from one user to another
+            client.cookies.jar.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+            logger.info('social_auth async http pool created, pool_size: %s, max_retries: %s', pool_size, max_retries)
+    return client
+
+
+async def close_async_clients():
+    """Close the clients of the running event loop, e.g. on ASGI lifespan shutdown."""
+    with _clients_lock:
+        clients = _clients.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        await client.aclose()
+
+
+def _owner(cls, name):
+    for klass in cls.__mro__:
+        if name in klass.__dict__:
+            return klass
+    return None
+
+
+class AsyncOAuth2Mixin:
+    """`auth_complete` of `BaseOAuth2` backends with the token exchange awaited.
+
+    Goes with `social_auth.http_pool.PooledHTTPMixin` (timeouts, pool settings, circuit
+    breaker). The user data request and the pipeline still run in the thread pool.
+    """
+
+    def async_complete_supported(self) -> bool:
+        # a backend customizing the exchange in sync code (e.g. OpenID Connect
+        # validating the id_token) keeps doing it in sync code
+        cls = type(self)
+        for name in ('auth_complete', 'request_access_token'):
+            owner = _owner(cls, name)
+            if owner is not _owner(BaseOAuth2, name) and not issubclass(_owner(cls, 'a' + name), owner):
+                return False
+        return True
+
+    def async_timeout(self):
+        import httpx
+
+        timeout = self.http_timeout()
+        if isinstance(timeout, (tuple, list)):
+            connect, read = timeout
+            return httpx.Timeout(read, connect=connect)
+        return httpx.Timeout(timeout)
+
+    async def arequest(self, url, method='GET', *args, **kwargs):
+        if self.SSL_PROTOCOL or self.setting('PROXIES') is not None or self.setting('VERIFY_SSL') is not None:
+            # configured on the sync session only
+            return await run_sync(self.request, url, method, *args, **kwargs)
+
+        import httpx
+
+        breaker = self.circuit_breaker()
+        if breaker is None:
+            return await self._arequest(url, method, *args, **kwargs)
+
+        breaker.before_call(self)
+        start = time.perf_counter()
+        failed = True
+        try:
+            response = await self._arequest(url, method, *args, **kwargs)
+            failed = False
+            return response
+        except httpx.HTTPStatusError as err:
+            # the provider answered, only its own troubles count
+            failed = err.response.status_code >= 500
+            raise
+        finally:
+            breaker.record(time.perf_counter() - start, failed)
+
+    async def _arequest(self, url, method='GET', *args, **kwargs):
+        import httpx
+
+        # copy from social_auth.http_pool.PooledHTTPMixin._request
+        headers = kwargs.pop('headers', None) or {}
+        if self.SEND_USER_AGENT and 'User-Agent' not in headers:
+            headers['User-Agent'] = self.setting('USER_AGENT') or user_agent()
+        kwargs.setdefault('timeout', self.async_timeout())
+
+        client = get_async_client(
+            self.setting('HTTP_POOL_SIZE', DEFAULT_POOL_SIZE),
+            self.setting('HTTP_MAX_RETRIES', DEFAULT_MAX_RETRIES),
+        )
+        start = time.perf_counter()
+        status = 'error'
+        try:
+            response = await client.request(method, url, *args, headers=headers, **kwargs)
+            status = response.status_code
+        except (httpx.ConnectError, httpx.TimeoutException) as err:
+            raise AuthFailed(self, str(err))
+        finally:
+            metrics.timing('http.request', (time.perf_counter() - start) * 1000, backend=self.name, status=status)
+        response.raise_for_status()
+        return response
+
+    async def aget_json(self, url, *args, **kwargs):
+        response = await self.arequest(url, *args, **kwargs)
+        return response.json()
+
+    async def arequest_access_token(self, *args, **kwargs):
+        return await self.aget_json(*args, **kwargs)
+
+    async def aauth_complete(self, *args, **kwargs):
+        import httpx
+
+        # copy from social_core.backends.oauth.BaseOAuth2.auth_complete
+        self.process_error(self.data)
+        state = self.validate_state()
+        data, params = None, None
+        if self.ACCESS_TOKEN_METHOD == 'GET':
+            params = self.auth_complete_params(state)
+        else:
+            data = self.auth_complete_params(state)
+
+        try:
+            response = await self.arequest_access_token(
+                self.access_token_url(),
+                data=data,
+                params=params,
+                headers=self.auth_headers(),
+                auth=self.auth_complete_credentials(),
+                method=self.ACCESS_TOKEN_METHOD
+            )
+        except (httpx.HTTPStatusError, HTTPError) as err:
+            # copy from social_core.utils.handle_http_errors,
+            # `HTTPError` of the requests `arequest` falls back to
+            status_code = err.response.status_code if err.response is not None else None
+            if status_code == 400:
+                raise AuthCanceled(self, response=err.response)
+            elif status_code == 401:
+                raise AuthForbidden(self)
+            elif status_code == 503:
+                raise AuthUnreachableProvider(self)
+            raise
+        self.process_error(response)
+        return await self.ado_auth(response['access_token'], response=response, *args, **kwargs)
+
+    async def ado_auth(self, access_token, *args, **kwargs):
+        if _owner(type(self), 'do_auth') is not _owner(BaseOAuth2, 'do_auth'):
+            return await run_sync(self.do_auth, access_token, *args, **kwargs)
+
+        # copy from social_core.backends.oauth.BaseOAuth2.do_auth
+        data = await run_sync(self.user_data, access_token, *args, **kwargs)
+        response = kwargs.get('response') or {}
+        response.update(data or {})
+        if 'access_token' not in response:
+            response['access_token'] = access_token
+        kwargs.update({'response': response, 'backend': self})
+        aauthenticate = getattr(self.strategy, 'aauthenticate', None)
+        if aauthenticate is not None:
+            return await aauthenticate(*args, **kwargs)
+        return await run_sync(self.strategy.authenticate, *args, **kwargs)
+
@@ -4,36 +4,68 @@ import os
 import time
 from django.apps import apps, AppConfig
 from django.conf import settings
-from django.core import management
 
 logger = logging.getLogger(__name__)
 
+# apps this plugin brings along, saleor itself does not install them
+PATCH_APP_NAMES = ('social_django', 'django.contrib.sessions', )
+
+
+def is_listed(app_name: str, installed_apps) -> bool:
+    return any(entry == app_name or entry.startswith(f'{app_name}.apps.') for entry in installed_apps)
+
+
 class SocialAuthConfig(AppConfig):
     name = 'social_auth'
     verbose_name = "Social Auth"
 
+    def __init__(self, app_name, app_module):
+        super().__init__(app_name, app_module)
+        self.extend_installed_apps()
+
+    @staticmethod
+    def extend_installed_apps():
+        """Append the missing patch apps to `INSTALLED_APPS` right when this config is created.
+
+        `apps.populate` is still in its first pass over that very list, the appended apps
+        are set up along with every other one, no need to rebuild the registry afterwards.
+        """
+        installed_apps = settings.INSTALLED_APPS
+        if apps.apps_ready or not isinstance(installed_apps, list):
+            return
+        missing = [name for name in PATCH_APP_NAMES if not is_listed(name, installed_apps)]
+        if missing:
+            installed_apps.extend(missing)
+            logger.info('SocialAuthConfig installing apps: %s', missing)
+
     def do_db_init_stuff(self):
+        from .db_init import migrate_apps
+
         start_time = time.time()
-        # for patch_app_name in patch_app_names:
-        #     management.call_command('migrate', patch_app_name.rsplit('.', maxsplit=1)[-1], interactive=False)
-        management.call_command('migrate', interactive=False)
-        logger.info('python manage.py migrate %s, elasped: %s sec', patch_app_names, time.time() - start_time)
+        app_labels = [apps.get_app_config(name.rsplit('.', maxsplit=1)[-1]).label for name in PATCH_APP_NAMES]
+        migrated = migrate_apps(app_labels)
+        logger.info(
+            'SocialAuthConfig db init, apps: %s, migrated: %s, elapsed: %.3f sec',
+            app_labels, migrated, time.time() - start_time,
+        )
 
     def ready(self):
-        patch_app_names = ('social_django', 'django.contrib.sessions', )
-        patch_app_installed = apps.is_installed(patch_app_names[0])
-
-        if patch_app_installed:
-            logger.info('SocialAuthConfig.ready, app: %s, is_installed: %s', patch_app_names[0], patch_app_installed)
-        else:
-            logger.info('SocialAuthConfig.ready, app: %s, is_installed: %s, doing initialization...', patch_app_names[0], patch_app_installed)
+        missing = [name for name in PATCH_APP_NAMES if not apps.is_installed(name)]
+        if missing:
+            # INSTALLED_APPS is a tuple or the registry was populated without it
+            logger.warning('SocialAuthConfig.ready, apps: %s, not installed, repopulating the app registry...', missing)
             # refer to
             # https://stackoverflow.com/questions/24027901/dynamically-loading-django-apps-at-runtime#answer-57897422
-            settings.INSTALLED_APPS += patch_app_names
+            settings.INSTALLED_APPS = list(settings.INSTALLED_APPS) + missing
             apps.app_configs = OrderedDict()
             apps.apps_ready = apps.models_ready = apps.loading = apps.ready = False
             apps.clear_cache()
             apps.populate(settings.INSTALLED_APPS)
+            # the fresh config of this app went through `ready()` already
+            return
+
+        # user cache invalidation
+        from . import signals  # noqa: F401
 
         init_str = os.environ.get("SOCIAL_AUTH_DB_INIT") or ''
         if init_str.lower() in ['true', '1', 't', 'y', 'yes', 'yeah', 'yup', 'certainly', 'uh-huh']:
@@ -0,0 +1,248 @@
+import base64
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding
+from social_core.backends.oauth import BaseOAuth2
+from social_core.exceptions import AuthFailed
+
+from ..aio import AsyncOAuth2Mixin
+from ..http_pool import PooledHTTPMixin
+from ..lru import BoundedLRU
+
+
+logger = logging.getLogger(__name__)
+
+# parsed keys of the last few configuration versions
+KEY_CACHE_SIZE = 32
+
+# timestamps of the gateway are Beijing time
+GATEWAY_TIMEZONE = timezone(timedelta(hours=8))
+SUCCESS_CODE = '10000'
+ERROR_NODE = 'error_response'
+
+_keys = BoundedLRU(KEY_CACHE_SIZE)
+
+
+def _decode_key(key: str, private: bool):
+    key = key.strip()
+    if key.startswith('-----BEGIN'):
+        data = key.encode('ascii')
+        if private:
+            return serialization.load_pem_private_key(data, password=None)
+        return serialization.load_pem_public_key(data)
+    # bare base64 body, as copied from the alipay open platform (PKCS#8 or PKCS#1 DER)
+    data = base64.b64decode(''.join(key.split()))
+    if private:
+        return serialization.load_der_private_key(data, password=None)
+    return serialization.load_der_public_key(data)
+
+
+def load_key(key: str, private: bool = False):
+    """RSA key of a PEM or bare base64 string, parsed once per distinct key string,
+    that is once per configuration version."""
+    cache_key = (key, private)
+    loaded = _keys.get(cache_key)
+    if loaded is not None:
+        return loaded
+
+    loaded = _decode_key(key, private)
+    _keys.set(cache_key, loaded)
+    logger.info('alipay %s key loaded', 'private' if private else 'public')
+    return loaded
+
+
+def sign_content(params: dict) -> str:
+    # non empty params but `sign`, sorted, `k=v` joined by `&`, values not url encoded
+    return '&'.join(
+        f'{name}={value}' for name, value in sorted(params.items())
+        if name != 'sign' and value not in (None, '')
+    )
+
+
+def response_node(text: str, node: str):
+    """`(raw json of the node, sign)` of a gateway response, the sign is computed
+    over the node exactly as sent, not over a re-serialization of it."""
+    decoder = json.JSONDecoder()
+    index = text.find(f'"{node}"')
+    if index < 0:
+        return None, None
+    start = text.index(':', index + len(node) + 2) + 1
+    while text[start] in ' \t\r\n':
+        start += 1
+    _, end = decoder.raw_decode(text, start)
+    return text[start:end], json.loads(text).get('sign')
+
+
+class AlipayAuth(PooledHTTPMixin, AsyncOAuth2Mixin, BaseOAuth2):
+    """
+    SOCIAL_AUTH_ALIPAY_KEY = APPID = XXX
+    SOCIAL_AUTH_ALIPAY_SECRET = app private key (RSA2, PEM or bare base64)
+    SOCIAL_AUTH_ALIPAY_PUBLIC_KEY = alipay public key (RSA2, PEM or bare base64)
+    SOCIAL_AUTH_ALIPAY_GATEWAY_URL = https://openapi-sandbox.dl.alipaydev.com/gateway.do (sandbox)
+    """
+    name = 'alipay'
+    AUTHORIZATION_URL = 'https://openauth.alipay.com/oauth2/publicAppAuthorize.htm'
+    ACCESS_TOKEN_URL = 'https://openapi.alipay.com/gateway.do'
+    ACCESS_TOKEN_METHOD = 'POST'
+    REFRESH_TOKEN_METHOD = 'POST'
+    RESPONSE_TYPE = None
+    # alipay keeps `state` on its own
+    REDIRECT_STATE = False
+    DEFAULT_SCOPE = ['auth_user']
+    SCOPE_SEPARATOR = ','
+
+    TOKEN_METHOD = 'alipay.system.oauth.token'
+    USER_INFO_METHOD = 'alipay.user.info.share'
+
+    EXTRA_DATA = [
+        # refer to social_core/backends/base.py:BaseAuth.extra_data
+        # (name, alias, discard,)
+        ('user_id', 'user_id', False,),
+        ('open_id', 'open_id', True,),
+        ('refresh_token', 'refresh_token', True,),
+        ('expires_in', 'expires', False,),
+    ]
+
+    def auth_params(self, state=None):
+        params = super().auth_params(state)
+        params['app_id'] = params.pop('client_id')
+        return params
+
+    def access_token_url(self):
+        return self.setting('GATEWAY_URL') or self.ACCESS_TOKEN_URL
+
+    def refresh_token_url(self):
+        return self.access_token_url()
+
+    def gateway_params(self, method, **biz_params):
+        client_id, client_secret = self.get_key_and_secret()
+        params = {
+            'app_id': client_id,
+            'method': method,
+            'format': 'JSON',
+            'charset': 'utf-8',
+            'sign_type': 'RSA2',
+            'timestamp': datetime.now(GATEWAY_TIMEZONE).strftime('%Y-%m-%d %H:%M:%S'),
+            'version': '1.0',
+            **biz_params,
+        }
+        signature = load_key(client_secret, private=True).sign(
+            sign_content(params).encode('utf-8'), padding.PKCS1v15(), hashes.SHA256(),
+        )
+        params['sign'] = base64.b64encode(signature).decode('ascii')
+        return params
+
+    def verified_node(self, method, text):
+        """The response node of `method`, its sign checked against the alipay public key.
+        Errors may come unsigned (e.g. an unknown app id), they are only reported."""
+        node = method.replace('.', '_') + '_response'
+        raw, sign = response_node(text, node)
+        if raw is None:
+            raw, sign = response_node(text, ERROR_NODE)
+            if raw is None:
+                raise AuthFailed(self, f'Unexpected alipay response of {method}')
+            return json.loads(raw)
+
+        public_key = self.setting('PUBLIC_KEY')
+        if not public_key:
+            raise AuthFailed(self, 'Alipay public key is not configured')
+        if not sign:
+            raise AuthFailed(self, f'Unsigned alipay response of {method}')
+        try:
+            load_key(public_key).verify(
+                base64.b64decode(sign), raw.encode('utf-8'), padding.PKCS1v15(), hashes.SHA256(),
+            )
+        except (InvalidSignature, ValueError, TypeError):
+            raise AuthFailed(self, f'Invalid alipay response signature of {method}')
+        return json.loads(raw)
+
+    def auth_complete_params(self, state=None):
+        # refer to
+        # https://opendocs.alipay.com/open/02ailc
+        return self.gateway_params(
+            self.TOKEN_METHOD,
+            grant_type='authorization_code',
+            code=self.data.get('auth_code') or self.data.get('code', ''),
+        )
+
+    def refresh_token_params(self, token, *args, **kwargs):
+        return self.gateway_params(self.TOKEN_METHOD, grant_type='refresh_token', refresh_token=token)
+
+    def request_access_token(self, *args, **kwargs):
+        logger.info('alipay request_access_token start')
+        response = self.request(*args, **kwargs)
+        logger.info('alipay request_access_token end, status: %s', response.status_code)
+        return self.align_access_token_response(self.verified_node(self.TOKEN_METHOD, response.text))
+
+    async def arequest_access_token(self, *args, **kwargs):
+        logger.info('alipay arequest_access_token start')
+        response = await self.arequest(*args, **kwargs)
+        logger.info('alipay arequest_access_token end, status: %s', response.status_code)
+        return self.align_access_token_response(self.verified_node(self.TOKEN_METHOD, response.text))
+
+    def process_refresh_token_response(self, response, *args, **kwargs):
+        return self.align_access_token_response(self.verified_node(self.TOKEN_METHOD, response.text))
+
+    def align_access_token_response(self, resp):
+        # in order to align with `python-social-auth` flow
+        # resp = {
+        #     "user_id": "", (or "open_id")
+        #     "access_token": "",
+        #     "expires_in": 0,
+        #     "refresh_token": "",
+        #     "re_expires_in": 0,
+        # }
+        # or on errors
+        # resp = {
+        #     "code": "40002",
+        #     "msg": "Invalid Arguments",
+        #     "sub_code": "isv.code-invalid",
+        #     "sub_msg": "",
+        # }
+        # ========================
+        # the common flow:
+        # resp = {
+        #     "access_token": ${access_token},
+        #     "error": ${sub_code},
+        #     "error_description": ${sub_msg},
+        # }
+        failed = 'code' in resp and resp['code'] != SUCCESS_CODE
+        resp.update({
+            "access_token": resp.get('access_token'),
+            "error": (resp.get('sub_code') or resp.get('code')) if failed else None,
+            "error_description": (resp.get('sub_msg') or resp.get('msg')) if failed else None,
+        })
+        return resp
+
+    def user_data(self, access_token, *args, **kwargs):
+        if 'auth_user' not in self.get_scope():
+            # `auth_base` only grants the user id, already in the token response
+            return {}
+        response = self.request(
+            self.access_token_url(),
+            method='POST',
+            data=self.gateway_params(self.USER_INFO_METHOD, auth_token=access_token),
+        )
+        data = self.verified_node(self.USER_INFO_METHOD, response.text)
+        if data.get('code') != SUCCESS_CODE:
+            raise AuthFailed(self, data.get('sub_msg') or data.get('msg') or 'alipay user info failed')
+        return data
+
+    def get_user_details(self, response):
+        # apps created after 2023 get `open_id` instead of `user_id`
+        username = response.get('user_id') or response.get('open_id')
+        email_host = self.setting('EMAIL_HOST') or 'alipay.com'
+        email = f'{username}@{email_host}'
+        return {
+            "username": username,
+            "email": email,
+            "first_name": response.get('nick_name') or '',
+        }
+
+    def get_user_id(self, details, response):
+        # in Saleor, we need email as uid
+        return details.get('email')
@@ -1,10 +1,13 @@
 import logging
 from social_core.backends.oauth import BaseOAuth2
 
+from ..aio import AsyncOAuth2Mixin
+from ..http_pool import PooledHTTPMixin
+
 
 logger = logging.getLogger(__name__)
 
-class WeappAuth(BaseOAuth2):
+class WeappAuth(PooledHTTPMixin, AsyncOAuth2Mixin, BaseOAuth2):
     """
     SOCIAL_AUTH_WEIXIN_WEAPP_KEY = APPID = XXX
     SOCIAL_AUTH_WEIXIN_WEAPP_SECRET = SECRET = XXX
@@ -52,6 +55,15 @@ class WeappAuth(BaseOAuth2):
         logger.info('weixin-weapp request_access_token start, args: %s, kwargs: %s', args, kwargs)
         resp = super().request_access_token(*args, **kwargs)
         logger.info('weixin-weapp request_access_token end, args: %s, kwargs: %s', args, kwargs)
+        return self.align_access_token_response(resp)
+
+    async def arequest_access_token(self, *args, **kwargs):
+        logger.info('weixin-weapp arequest_access_token start, args: %s, kwargs: %s', args, kwargs)
+        resp = await super().arequest_access_token(*args, **kwargs)
+        logger.info('weixin-weapp arequest_access_token end, args: %s, kwargs: %s', args, kwargs)
+        return self.align_access_token_response(resp)
+
+    def align_access_token_response(self, resp):
         # in order to align with `python-social-auth` flow
         # resp = {
         #     "opendid": "",
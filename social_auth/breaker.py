@@ -0,0 +1,189 @@
+import logging
+import threading
+import time
+from collections import deque
+
+from social_core.exceptions import AuthUnreachableProvider
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+# gauge values of `social_auth.circuit.state`
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+DEFAULT_WINDOW = 30
+DEFAULT_MIN_CALLS = 20
+DEFAULT_ERROR_RATE = 0.5
+DEFAULT_SLOW_RATE = 0.5
+DEFAULT_LATENCY_BUDGET = 2.0
+DEFAULT_OPEN_TIMEOUT = 30
+DEFAULT_HALF_OPEN_CALLS = 3
+
+
+class CircuitOpenError(AuthUnreachableProvider):
+    """Provider calls of the backend are short-circuited for now."""
+
+    def __init__(self, backend, retry_after: float):
+        super().__init__(backend)
+        self.retry_after = retry_after
+
+    def __str__(self):
+        return (
+            f'{self.backend.name} is not available at the moment, '
+            f'try again in {max(int(self.retry_after), 1)} seconds'
+        )
+
+
+class CircuitBreaker:
+    """Rolling window of the provider calls of one backend.
+
+    Opens once `min_calls` calls of the last `window` seconds have an error rate
+    (connection errors, timeouts, 5xx) of `error_rate` or more, or a rate of calls
+    slower than `latency_budget` seconds of `slow_rate` or more. Calls fail fast while
+    open, after `open_timeout` seconds `half_open_calls` probes are let through:
+    all of them fine closes the circuit again, any failure opens it.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window: float = DEFAULT_WINDOW,
+        min_calls: int = DEFAULT_MIN_CALLS,
+        error_rate: float = DEFAULT_ERROR_RATE,
+        slow_rate: float = DEFAULT_SLOW_RATE,
+        latency_budget: float = DEFAULT_LATENCY_BUDGET,
+        open_timeout: float = DEFAULT_OPEN_TIMEOUT,
+        half_open_calls: int = DEFAULT_HALF_OPEN_CALLS,
+    ):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.latency_budget = latency_budget
+        self.open_timeout = open_timeout
+        self.half_open_calls = half_open_calls
+
+        self.lock = threading.Lock()
+        self.state = CLOSED
+        self.opened_at = 0.0
+        # [second, calls, errors, slow calls], one per second of the window
+        self.buckets = deque()
+        self.probes = 0
+        self.probe_successes = 0
+
+    def _set_state(self, state, now):
+        previous, self.state = self.state, state
+        if state == OPEN:
+            self.opened_at = now
+        if state != CLOSED:
+            self.probes = self.probe_successes = 0
+        else:
+            self.buckets.clear()
+        logger.warning('social_auth circuit %s, backend: %s, from: %s', state, self.name, previous)
+        metrics.incr('circuit.transition', backend=self.name, state=state)
+        metrics.gauge('circuit.state', STATE_VALUES[state], backend=self.name)
+
+    def before_call(self, backend):
+        """Raise `CircuitOpenError` unless the call may go out, every call let through
+        has to be followed by `record()`."""
+        now = time.monotonic()
+        with self.lock:
+            if self.state == OPEN:
+                retry_after = self.opened_at + self.open_timeout - now
+                if retry_after > 0:
+                    metrics.incr('circuit.rejected', backend=self.name)
+                    raise CircuitOpenError(backend, retry_after)
+                self._set_state(HALF_OPEN, now)
+            if self.state == HALF_OPEN:
+                if self.probes >= self.half_open_calls:
+                    metrics.incr('circuit.rejected', backend=self.name)
+                    raise CircuitOpenError(backend, 1)
+                self.probes += 1
+
+    def record(self, duration: float, failed: bool):
+        now = time.monotonic()
+        slow = duration > self.latency_budget
+        with self.lock:
+            if self.state == HALF_OPEN:
+                if failed or slow:
+                    self._set_state(OPEN, now)
+                else:
+                    self.probe_successes += 1
+                    if self.probe_successes >= self.half_open_calls:
+                        self._set_state(CLOSED, now)
+                return
+            if self.state == OPEN:
+                # let through before it opened
+                return
+
+            second = int(now)
+            if self.buckets and self.buckets[-1][0] == second:
+                bucket = self.buckets[-1]
+            else:
+                bucket = [second, 0, 0, 0]
+                self.buckets.append(bucket)
+            bucket[1] += 1
+            bucket[2] += failed
+            bucket[3] += slow
+            while self.buckets and self.buckets[0][0] <= second - self.window:
+                self.buckets.popleft()
+
+            calls = errors = slow_calls = 0
+            for _, bucket_calls, bucket_errors, bucket_slow in self.buckets:
+                calls += bucket_calls
+                errors += bucket_errors
+                slow_calls += bucket_slow
+            if calls >= self.min_calls and (
+                errors / calls >= self.error_rate or slow_calls / calls >= self.slow_rate
+            ):
+                self._set_state(OPEN, now)
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str, **options) -> CircuitBreaker:
+    """Process-wide breaker of a backend, a new one (closed) once its settings change."""
+    key = (name, tuple(sorted(options.items())))
+    breaker = _breakers.get(key)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(key)
+            if breaker is None:
+                breaker = _breakers[key] = CircuitBreaker(name, **options)
+    return breaker
+
+
+def get_breaker_states() -> dict:
+    """`{backend name: state}`, for health checks and the like."""
+    return {breaker.name: breaker.state for breaker in list(_breakers.values())}
+
+
+class CircuitBreakerMixin:
+    """Per backend circuit breaker around the provider calls of `PooledHTTPMixin`.
+
+    Settings (per backend `SOCIAL_AUTH_<BACKEND>_*` or global `SOCIAL_AUTH_*`):
+    `CIRCUIT_BREAKER` (on by default), `CIRCUIT_WINDOW`, `CIRCUIT_MIN_CALLS`,
+    `CIRCUIT_ERROR_RATE`, `CIRCUIT_SLOW_RATE`, `CIRCUIT_LATENCY_BUDGET`,
+    `CIRCUIT_OPEN_TIMEOUT`, `CIRCUIT_HALF_OPEN_CALLS`
+    """
+
+    def circuit_breaker(self):
+        if not self.setting('CIRCUIT_BREAKER', True):
+            return None
+        return get_breaker(
+            self.name,
+            window=self.setting('CIRCUIT_WINDOW', DEFAULT_WINDOW),
+            min_calls=self.setting('CIRCUIT_MIN_CALLS', DEFAULT_MIN_CALLS),
+            error_rate=self.setting('CIRCUIT_ERROR_RATE', DEFAULT_ERROR_RATE),
+            slow_rate=self.setting('CIRCUIT_SLOW_RATE', DEFAULT_SLOW_RATE),
+            latency_budget=self.setting('CIRCUIT_LATENCY_BUDGET', DEFAULT_LATENCY_BUDGET),
+            open_timeout=self.setting('CIRCUIT_OPEN_TIMEOUT', DEFAULT_OPEN_TIMEOUT),
+            half_open_calls=self.setting('CIRCUIT_HALF_OPEN_CALLS', DEFAULT_HALF_OPEN_CALLS),
+        )
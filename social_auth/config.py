@@ -0,0 +1,76 @@
+import hashlib
+import logging
+from django.core.exceptions import ValidationError
+
+from saleor.plugins.error_codes import PluginErrorCode
+
+from . import CONFIG_CODE
+from .lru import BoundedLRU
+
+logger = logging.getLogger(__name__)
+
+# number of distinct configuration versions kept per process,
+# old versions fall out once the dashboard config has been changed a few times
+SETTINGS_CACHE_SIZE = 32
+
+_settings_cache = BoundedLRU(SETTINGS_CACHE_SIZE)
+
+
+def get_config_version(configuration) -> str:
+    # configuration is an array of dict, just like in the db
+    digest = hashlib.sha256()
+    for config in sorted(configuration, key=lambda c: c['name']):
+        digest.update(str(config['name']).encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(str(config['value'] or '').encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def parse_settings(raw_config: str) -> dict:
+    # only on a cache miss of `get_settings`
+    import yaml
+
+    try:
+        settings = yaml.safe_load(raw_config or '') or {}
+    except yaml.YAMLError as error:
+        raise ValidationError(
+            {CONFIG_CODE: ValidationError(f'Invalid YAML: {error}', code=PluginErrorCode.INVALID.value)}
+        )
+    if not isinstance(settings, dict):
+        raise ValidationError(
+            {CONFIG_CODE: ValidationError('YAML content should be a mapping', code=PluginErrorCode.INVALID.value)}
+        )
+    return settings
+
+
+def get_settings(configuration):
+    """Return `(version, settings)` of the plugin configuration.
+
+    The parsed settings are shared by every plugin instance of the same
+    configuration version, treat them as read only.
+    """
+    version = get_config_version(configuration)
+    settings = _settings_cache.get(version)
+    if settings is not None:
+        return version, settings
+
+    raw_config = ''
+    for config in configuration:
+        if config['name'] == CONFIG_CODE:
+            raw_config = config['value']
+    settings = parse_settings(raw_config)
+    logger.info('social_auth settings compiled, version: %s, keys: %s', version, list(settings))
+
+    _settings_cache.set(version, settings)
+    return version, settings
+
+
+def invalidate_settings():
+    _settings_cache.clear()
+
+
+def setting(settings: dict, name: str, default=None):
+    # plugin level setting, same naming convention as `python-social-auth`
+    value = settings.get(f'SOCIAL_AUTH_{name}')
+    return default if value is None else value
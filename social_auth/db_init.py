@@ -0,0 +1,83 @@
+import logging
+import pkgutil
+import zlib
+from contextlib import contextmanager
+from importlib import import_module
+
+from django.core import management
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.migrations.executor import MigrationExecutor
+from django.db.migrations.loader import MigrationLoader
+from django.db.migrations.recorder import MigrationRecorder
+
+logger = logging.getLogger(__name__)
+
+# the same on every replica, unlikely to clash with other users of advisory locks
+DB_INIT_LOCK_ID = zlib.crc32(b'social_auth.db_init')
+
+
+def migration_names_on_disk(app_label: str) -> set:
+    module_name, _ = MigrationLoader.migrations_module(app_label)
+    if module_name is None:
+        return set()
+    module = import_module(module_name)
+    return {
+        name for _, name, is_pkg in pkgutil.iter_modules(module.__path__)
+        if not is_pkg and name[0] not in '_~'
+    }
+
+
+def is_migrated(connection, app_labels) -> bool:
+    """Cheap check on the migration recorder, without loading the migration graph.
+
+    `False` may still have nothing to apply (e.g. squashed migrations), the plan tells.
+    """
+    applied = MigrationRecorder(connection).applied_migrations()
+    return all(
+        (app_label, name) in applied
+        for app_label in app_labels
+        for name in migration_names_on_disk(app_label)
+    )
+
+
+def migration_plan(connection, app_labels) -> list:
+    executor = MigrationExecutor(connection)
+    targets = [key for key in executor.loader.graph.leaf_nodes() if key[0] in app_labels]
+    return executor.migration_plan(targets)
+
+
+@contextmanager
+def advisory_lock(connection, lock_id: int = DB_INIT_LOCK_ID):
+    """Session level lock, replicas booting together migrate one at a time.
+
+    Only PostgreSQL has them, a no-op elsewhere.
+    """
+    if connection.vendor != 'postgresql':
+        yield
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_lock(%s)', [lock_id])
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_unlock(%s)', [lock_id])
+
+
+def migrate_apps(app_labels, using: str = DEFAULT_DB_ALIAS) -> list:
+    """Apply the missing migrations of `app_labels` (and their dependencies) only.
+
+    Returns the applied migrations, `[]` when everything was there already.
+    """
+    connection = connections[using]
+    if is_migrated(connection, app_labels):
+        return []
+
+    with advisory_lock(connection):
+        # another replica may have done it while we were waiting for the lock
+        plan = migration_plan(connection, app_labels)
+        pending_labels = {migration.app_label for migration, _ in plan if migration.app_label in app_labels}
+        for app_label in app_labels:
+            if app_label in pending_labels:
+                management.call_command('migrate', app_label, database=using, interactive=False, verbosity=0)
+    return [f'{migration.app_label}.{migration.name}' for migration, _ in plan]
@@ -0,0 +1,127 @@
+import logging
+from urllib.parse import urlparse
+
+from django.http.request import split_domain_port
+
+from .lru import BoundedLRU
+
+logger = logging.getLogger(__name__)
+
+MATCHER_CACHE_SIZE = 32
+
+# trie node markers, kept apart from the labels (strings)
+_EXACT = object()
+_SUBDOMAINS = object()
+
+
+class HostMatcher:
+    """Host allowlist compiled into a trie of reversed labels, a lookup walks the labels
+    of the host once, whatever the size of the list.
+
+    Patterns, as django `ALLOWED_HOSTS` plus `*.` wildcards:
+    `example.com` exactly that host, `.example.com` the domain and all its subdomains,
+    `*.example.com` its subdomains only, `*` anything.
+    A pattern with a port (`localhost:3000`) only matches that exact netloc.
+    """
+
+    def __init__(self, patterns=()):
+        self.any = False
+        self.root = {}
+        self.netlocs = set()
+        for pattern in patterns:
+            self.add(pattern)
+
+    def add(self, pattern: str):
+        pattern = pattern.strip().lower()
+        if pattern == '*':
+            self.any = True
+            return
+
+        marker = _EXACT
+        host = pattern
+        if host.startswith('.'):
+            host = host[1:]
+            # both
+            marker = None
+        elif host.startswith('*.'):
+            host = host[2:]
+            marker = _SUBDOMAINS
+        domain, port = split_domain_port(host)
+        labels = domain.split('.')
+        if not domain or not all(labels) or (port and marker != _EXACT):
+            logger.warning('social_auth host pattern ignored, pattern: %s', pattern)
+            return
+        if port:
+            self.netlocs.add(pattern)
+            return
+
+        node = self.root
+        for label in reversed(labels):
+            node = node.setdefault(label, {})
+        if marker is None:
+            node[_EXACT] = node[_SUBDOMAINS] = True
+        else:
+            node[marker] = True
+
+    def match_host(self, host: str) -> bool:
+        """`host` lowercased and without port, as from `split_domain_port`."""
+        if self.any:
+            return True
+        if not host:
+            return False
+        labels = host.split('.')
+        node = self.root
+        for index in range(len(labels) - 1, -1, -1):
+            node = node.get(labels[index])
+            if node is None:
+                return False
+            if index and _SUBDOMAINS in node:
+                return True
+        return _EXACT in node
+
+    def match_netloc(self, netloc: str) -> bool:
+        netloc = netloc.lower()
+        if netloc in self.netlocs:
+            return True
+        domain, port = split_domain_port(netloc)
+        if port:
+            return self.any
+        return self.match_host(domain)
+
+
+_matcher_cache = BoundedLRU(MATCHER_CACHE_SIZE)
+
+
+def get_host_matcher(patterns) -> HostMatcher:
+    """Compiled once per patterns list object, e.g. `settings.ALLOWED_CLIENT_HOSTS` or the
+    `SOCIAL_AUTH_ALLOWED_REDIRECT_HOSTS` of a configuration version.
+
+    Lists are expected not to change in place, a new configuration comes as a new list.
+    """
+    key = id(patterns)
+    entry = _matcher_cache.get(key)
+    # the list itself is kept in the entry, its id can not be reused meanwhile
+    if entry is not None and entry[0] is patterns:
+        return entry[1]
+
+    matcher = HostMatcher(patterns)
+    _matcher_cache.set(key, (patterns, matcher))
+    return matcher
+
+
+def sanitize_redirect(matcher: HostMatcher, request_host: str, redirect_to):
+    """`social_core.utils.sanitize_redirect` on a compiled allowlist, the request host
+    is always allowed."""
+    # Avoid redirect on evil URLs like ///evil.com
+    if not redirect_to or not hasattr(redirect_to, 'startswith') or \
+       redirect_to.startswith('///'):
+        return None
+
+    try:
+        netloc = urlparse(redirect_to)[1]
+    except (TypeError, AttributeError, ValueError):
+        return None
+    # relative urls stay on the request host
+    if not netloc or netloc == request_host or matcher.match_netloc(netloc):
+        return redirect_to
+    return None
@@ -0,0 +1,126 @@
+import logging
+import threading
+import time
+from http.cookiejar import DefaultCookiePolicy
+
+from requests import ConnectionError, HTTPError, Session, Timeout
+from requests.adapters import HTTPAdapter
+from social_core.exceptions import AuthFailed
+from social_core.utils import user_agent
+from urllib3.util.retry import Retry
+
+from . import metrics
+from .breaker import DEFAULT_LATENCY_BUDGET, CircuitBreakerMixin
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_CONNECT_TIMEOUT = 3.05
+DEFAULT_READ_TIMEOUT = 10
+DEFAULT_MAX_RETRIES = 2
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(pool_size: int = DEFAULT_POOL_SIZE, max_retries: int = DEFAULT_MAX_RETRIES) -> Session:
+    """Per-process keep-alive session, one per pool setup."""
+    key = (pool_size, max_retries)
+    session = _sessions.get(key)
+    if session is not None:
+        return session
+
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = Session()
+            # shared by every login, never carry provider cookies from one user to another
+            session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+            # only retry what never reached the provider, an authorization code is single use
+            retry = Retry(total=max_retries, connect=max_retries, read=0, status=0, backoff_factor=0.1)
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _sessions[key] = session
+            logger.info('social_auth http pool created, pool_size: %s, max_retries: %s', pool_size, max_retries)
+    return session
+
+
+def close_sessions():
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+class PooledHTTPMixin(CircuitBreakerMixin):
+    """Send backend requests through the shared keep-alive pool, behind the backend's
+    circuit breaker.
+
+    Settings (per backend `SOCIAL_AUTH_<BACKEND>_*` or global `SOCIAL_AUTH_*`):
+    `HTTP_POOL_SIZE`, `HTTP_CONNECT_TIMEOUT`, `HTTP_READ_TIMEOUT`, `HTTP_MAX_RETRIES`,
+    the timeouts capped by `CIRCUIT_LATENCY_BUDGET` while the circuit breaker is on
+    """
+
+    def http_timeout(self):
+        timeout = self.setting('REQUESTS_TIMEOUT') or self.setting('URLOPEN_TIMEOUT') or (
+            self.setting('HTTP_CONNECT_TIMEOUT', DEFAULT_CONNECT_TIMEOUT),
+            self.setting('HTTP_READ_TIMEOUT', DEFAULT_READ_TIMEOUT),
+        )
+        if not self.setting('CIRCUIT_BREAKER', True):
+            return timeout
+        # a call slower than the latency budget is a slow one anyway, never wait longer
+        budget = self.setting('CIRCUIT_LATENCY_BUDGET', DEFAULT_LATENCY_BUDGET)
+        if isinstance(timeout, (tuple, list)):
+            return tuple(min(value, budget) for value in timeout)
+        return min(timeout, budget)
+
+    def request(self, url, method='GET', *args, **kwargs):
+        breaker = self.circuit_breaker()
+        if breaker is None:
+            return self._request(url, method, *args, **kwargs)
+
+        breaker.before_call(self)
+        start = time.perf_counter()
+        failed = True
+        try:
+            response = self._request(url, method, *args, **kwargs)
+            failed = False
+            return response
+        except HTTPError as err:
+            # the provider answered, only its own troubles count
+            failed = err.response is not None and err.response.status_code >= 500
+            raise
+        finally:
+            breaker.record(time.perf_counter() - start, failed)
+
+    def _request(self, url, method='GET', *args, **kwargs):
+        if self.SSL_PROTOCOL:
+            # needs its own ssl adapter
+            return super().request(url, method, *args, **kwargs)
+
+        # copy from social_core.backends.base.BaseAuth.request
+        kwargs.setdefault('headers', {})
+        if self.setting('PROXIES') is not None:
+            kwargs.setdefault('proxies', self.setting('PROXIES'))
+        if self.setting('VERIFY_SSL') is not None:
+            kwargs.setdefault('verify', self.setting('VERIFY_SSL'))
+        kwargs.setdefault('timeout', self.http_timeout())
+        if self.SEND_USER_AGENT and 'User-Agent' not in kwargs['headers']:
+            kwargs['headers']['User-Agent'] = self.setting('USER_AGENT') or user_agent()
+
+        session = get_session(
+            self.setting('HTTP_POOL_SIZE', DEFAULT_POOL_SIZE),
+            self.setting('HTTP_MAX_RETRIES', DEFAULT_MAX_RETRIES),
+        )
+        start = time.perf_counter()
+        status = 'error'
+        try:
+            response = session.request(method, url, *args, **kwargs)
+            status = response.status_code
+        except (ConnectionError, Timeout) as err:
+            raise AuthFailed(self, str(err))
+        finally:
+            metrics.timing('http.request', (time.perf_counter() - start) * 1000, backend=self.name, status=status)
+        response.raise_for_status()
+        return response
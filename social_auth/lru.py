@@ -0,0 +1,39 @@
+import threading
+from collections import OrderedDict
+
+
+class BoundedLRU:
+    """Thread-safe mapping of at most `size` entries, the least recently used one
+    dropped first. Per-process caches of compiled things (settings, registries...).
+
+    Values are built by the caller outside of the lock: concurrent misses of a key may
+    both build it, the last one stored wins.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
@@ -0,0 +1,87 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from ... import DEFAULT_BACKEND_CODE, DEFAULT_STATE_STORE, SOCIAL_STORAGE_CODE, SOCIAL_STRATEGY_CODE, STATE_STORE_CODE
+from ...config import get_settings, setting
+from ...provision import DEFAULT_IMPORT_CHUNK_SIZE, import_file
+from ...registry import get_registry
+
+
+def load_backend(name: str = None):
+    """Backend of the saved plugin configuration, as the hooks get it."""
+    from saleor.plugins.models import PluginConfiguration
+
+    from ...plugin import SocialAuthPlugin
+
+    plugin_configuration = PluginConfiguration.objects.filter(identifier=SocialAuthPlugin.PLUGIN_ID).first()
+    if plugin_configuration is None:
+        raise CommandError(f'{SocialAuthPlugin.PLUGIN_ID} is not configured yet')
+    values = {item['name']: item['value'] for item in SocialAuthPlugin.DEFAULT_CONFIGURATION}
+    values.update((item['name'], item['value']) for item in plugin_configuration.configuration or [])
+    configuration = [{'name': config_name, 'value': value} for config_name, value in values.items()]
+
+    version, settings = get_settings(configuration)
+    registry = get_registry(
+        version,
+        values[SOCIAL_STRATEGY_CODE],
+        values[SOCIAL_STORAGE_CODE],
+        setting(settings, 'AUTHENTICATION_BACKENDS', []),
+        values.get(STATE_STORE_CODE) or DEFAULT_STATE_STORE,
+    )
+    strategy = registry.get_strategy(settings, {})
+    name = name or values.get(DEFAULT_BACKEND_CODE)
+    if not name:
+        raise CommandError('no --backend given and no default backend configured')
+    try:
+        return registry.get_backend(strategy, name)
+    except Exception as error:
+        raise CommandError(f'backend {name} is not available: {error}')
+
+
+class Command(BaseCommand):
+    help = (
+        'Create the users & social associations of provider responses (openid, unionid...) '
+        'from a CSV or JSONL file, as logins through the backend would, in bulk. '
+        'Resumable, existing users & associations are kept.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV with a header row or JSONL, one provider response per record')
+        parser.add_argument('--format', choices=('csv', 'jsonl'), default=None, help='by file extension if missing')
+        parser.add_argument('--backend', default=None, help='backend name, the default backend if missing')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_IMPORT_CHUNK_SIZE, help='records per transaction')
+        parser.add_argument('--checkpoint', default=None, help='progress file, `<path>.checkpoint` if missing')
+        parser.add_argument('--restart', action='store_true', help='ignore the checkpoint, start over')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        backend = load_backend(options['backend'])
+        checkpoint_path = options['checkpoint'] or f'{options["path"]}.checkpoint'
+        if options['restart'] and os.path.exists(checkpoint_path):
+            # rows imported already are skipped anyway
+            os.remove(checkpoint_path)
+
+        def progress(totals, elapsed):
+            self.stdout.write(
+                f'{totals["records"]} records, {totals["users"]} users & {totals["accounts"]} accounts created, '
+                f'{totals["existing"]} existing, {totals["skipped"]} skipped, '
+                f'{totals["records"] / max(elapsed, 1e-6):.0f} records/sec'
+            )
+
+        try:
+            totals = import_file(
+                backend,
+                options['path'],
+                fmt=options['format'],
+                chunk_size=options['chunk_size'],
+                checkpoint_path=checkpoint_path,
+                using=options['database'],
+                progress=progress,
+            )
+        except (OSError, ValueError) as error:
+            raise CommandError(str(error))
+        self.stdout.write(
+            f'done, {totals["users"]} users & {totals["accounts"]} accounts created of {totals["records"]} records'
+        )
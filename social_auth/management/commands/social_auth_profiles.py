@@ -0,0 +1,46 @@
+from datetime import datetime
+
+from django.core.cache import DEFAULT_CACHE_ALIAS
+from django.core.management.base import BaseCommand
+
+from ...profiling import clear_profiles, get_shared_profiles
+
+
+class Command(BaseCommand):
+    help = (
+        'Show the slowest sampled hook calls (SOCIAL_AUTH_PROFILE_RATE) of every hook & backend, '
+        'with their query counts and cProfile stats, as collected by all the workers.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cache-alias', default=DEFAULT_CACHE_ALIAS, help='SOCIAL_AUTH_PROFILE_CACHE_ALIAS')
+        parser.add_argument('--hook', default=None, help='e.g. external_obtain_access_tokens')
+        parser.add_argument('--backend', default=None, help='e.g. weixin-weapp')
+        parser.add_argument('--limit', type=int, default=None, help='calls per hook & backend')
+        parser.add_argument('--stats', action='store_true', help='print the cProfile stats too')
+        parser.add_argument('--clear', action='store_true', help='drop the collected profiles')
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            clear_profiles(options['cache_alias'])
+            self.stdout.write('profiles cleared')
+            return
+
+        profiles = get_shared_profiles(options['cache_alias'])
+        if not profiles:
+            self.stdout.write('no profiles collected yet')
+            return
+        for key, entries in sorted(profiles.items()):
+            if options['hook'] and entries[0]['hook'] != options['hook']:
+                continue
+            if options['backend'] and entries[0]['backend'] != options['backend']:
+                continue
+            self.stdout.write(self.style.MIGRATE_HEADING(key))
+            for entry in entries[:options['limit']]:
+                self.stdout.write(
+                    f'  {entry["duration_ms"]:10.1f} ms  {entry["queries"]:4} queries '
+                    f'({entry["sql_ms"]:.1f} ms)  {entry["outcome"]:5}  '
+                    f'{datetime.fromtimestamp(entry["at"]).isoformat(timespec="seconds")}  pid {entry["pid"]}'
+                )
+                if options['stats']:
+                    self.stdout.write(entry['profile'])
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from ...state import DEFAULT_PURGE_BATCH_SIZE, DEFAULT_PURGE_SLEEP, purge_expired_states
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete expired OAuth state rows of social_auth.state.DBStateStore from django_session, '
+        'in batches, other sessions are left alone.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_PURGE_BATCH_SIZE)
+        parser.add_argument('--sleep', type=float, default=DEFAULT_PURGE_SLEEP, help='seconds between batches')
+        parser.add_argument('--max-batches', type=int, default=None, help='stop after this many batches')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        purged = purge_expired_states(
+            batch_size=options['batch_size'],
+            sleep=options['sleep'],
+            max_batches=options['max_batches'],
+            using=options['database'],
+        )
+        self.stdout.write(f'{purged} expired state rows removed')
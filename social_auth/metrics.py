@@ -0,0 +1,226 @@
+import logging
+import socket
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+logger = logging.getLogger(__name__)
+
+PREFIX = 'social_auth'
+
+
+class BaseSink:
+    """Receives the measurements, timings are in milliseconds."""
+
+    def timing(self, name: str, value: float, tags: dict):
+        raise NotImplementedError('Implement in subclass')
+
+    def incr(self, name: str, value: int = 1, tags: dict = None):
+        raise NotImplementedError('Implement in subclass')
+
+    def gauge(self, name: str, value: float, tags: dict = None):
+        raise NotImplementedError('Implement in subclass')
+
+    def close(self):
+        """Release what the sink holds (sockets...), once it is replaced."""
+
+
+class LoggingSink(BaseSink):
+
+    def __init__(self, level=logging.INFO):
+        self.level = logging.getLevelName(level) if isinstance(level, str) else level
+
+    def timing(self, name, value, tags):
+        logger.log(self.level, 'timing %s %.3fms %s', name, value, tags)
+
+    def incr(self, name, value=1, tags=None):
+        logger.log(self.level, 'incr %s %s %s', name, value, tags)
+
+    def gauge(self, name, value, tags=None):
+        logger.log(self.level, 'gauge %s %s %s', name, value, tags)
+
+
+class StatsdSink(BaseSink):
+    """Fire-and-forget UDP, statsd line protocol with dogstatsd style tags."""
+
+    def __init__(self, host='127.0.0.1', port=8125):
+        self.address = (host, int(port))
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setblocking(False)
+
+    def send(self, name, value, kind, tags):
+        line = f'{name}:{value}|{kind}'
+        if tags:
+            line += '|#' + ','.join(f'{key}:{tag}' for key, tag in tags.items())
+        try:
+            self.socket.sendto(line.encode('utf-8'), self.address)
+        except OSError:
+            # metrics never break a login
+            pass
+
+    def timing(self, name, value, tags):
+        self.send(name, f'{value:.3f}', 'ms', tags)
+
+    def incr(self, name, value=1, tags=None):
+        self.send(name, value, 'c', tags)
+
+    def gauge(self, name, value, tags=None):
+        self.send(name, value, 'g', tags)
+
+    def close(self):
+        # a span still holding the sink gets OSError, dropped by `send`
+        self.socket.close()
+
+
+class MemorySink(BaseSink):
+    """Keeps everything in lists, for tests and the benchmarks."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.timings = []
+        self.counters = []
+        self.gauges = []
+
+    def timing(self, name, value, tags):
+        with self.lock:
+            self.timings.append((name, value, dict(tags)))
+
+    def incr(self, name, value=1, tags=None):
+        with self.lock:
+            self.counters.append((name, value, dict(tags or {})))
+
+    def gauge(self, name, value, tags=None):
+        with self.lock:
+            self.gauges.append((name, value, dict(tags or {})))
+
+    def clear(self):
+        with self.lock:
+            self.timings, self.counters, self.gauges = [], [], []
+
+
+_sink = None
+# the one `configure()` built, a sink of `set_sink()` is its owner's to close
+_configured_sink = None
+_configured_version = None
+_configure_lock = threading.Lock()
+
+
+def configure(version: str, settings: dict):
+    """Set the process sink up from `SOCIAL_AUTH_METRICS_SINK` (dotted path) and
+    `SOCIAL_AUTH_METRICS_OPTIONS` (its kwargs), once per configuration version.
+    The sink of the previous version is closed."""
+    global _sink, _configured_sink, _configured_version
+    if version == _configured_version:
+        return
+    with _configure_lock:
+        if version == _configured_version:
+            return
+        sink_class_str = settings.get('SOCIAL_AUTH_METRICS_SINK')
+        sink = None
+        if sink_class_str:
+            from social_core.utils import module_member
+
+            try:
+                sink = module_member(sink_class_str)(**(settings.get('SOCIAL_AUTH_METRICS_OPTIONS') or {}))
+            except Exception:
+                logger.exception('social_auth metrics sink %s not loaded, metrics disabled', sink_class_str)
+        previous, _configured_sink = _configured_sink, sink
+        _sink = sink
+        _configured_version = version
+    # sinks of a dotted path are not required to subclass `BaseSink`
+    close = getattr(previous, 'close', None)
+    if close is not None:
+        try:
+            close()
+        except Exception:
+            logger.exception('social_auth metrics sink %s not closed', type(previous).__name__)
+
+
+def set_sink(sink: BaseSink = None):
+    global _sink
+    _sink = sink
+
+
+def get_sink() -> BaseSink:
+    return _sink
+
+
+def incr(name: str, value: int = 1, **tags):
+    if _sink is not None:
+        _sink.incr(f'{PREFIX}.{name}', value, tags)
+
+
+def gauge(name: str, value: float, **tags):
+    if _sink is not None:
+        _sink.gauge(f'{PREFIX}.{name}', value, tags)
+
+
+def timing(name: str, value: float, **tags):
+    if _sink is not None:
+        _sink.timing(f'{PREFIX}.{name}', value, tags)
+
+
+class Span:
+    """Timing of a hook call, `stage()` times its parts.
+
+    Tagged by whatever `set_tag()` adds (backend...) and the `outcome`.
+    """
+
+    def __init__(self, sink: BaseSink, name: str, **tags):
+        self.sink = sink
+        self.name = f'{PREFIX}.{name}'
+        self.tags = tags
+
+    def set_tag(self, key, value):
+        self.tags[key] = value
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        tags = dict(self.tags, outcome='ok' if exc_type is None else 'error')
+        self.sink.timing(self.name, (time.perf_counter() - self.start) * 1000, tags)
+        self.sink.incr(f'{self.name}.calls', 1, tags)
+        return False
+
+    @contextmanager
+    def stage(self, name: str):
+        outcome = 'ok'
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            outcome = 'error'
+            raise
+        finally:
+            self.sink.timing(
+                f'{self.name}.{name}', (time.perf_counter() - start) * 1000, dict(self.tags, outcome=outcome)
+            )
+
+
+class NullSpan:
+    """What `span()` hands out with metrics disabled, does nothing."""
+
+    _stage = nullcontext()
+
+    def set_tag(self, key, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def stage(self, name: str):
+        return self._stage
+
+
+NULL_SPAN = NullSpan()
+
+
+def span(name: str, **tags):
+    if _sink is None:
+        return NULL_SPAN
+    return Span(_sink, name, **tags)
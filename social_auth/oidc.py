@@ -0,0 +1,162 @@
+import base64
+import json
+import logging
+import re
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 3600
+MIN_TTL = 60
+MAX_TTL = 86400
+# refresh in background once this share of the ttl is gone
+REFRESH_AHEAD = 0.8
+# at most one forced refresh per document within this many seconds
+MIN_REFRESH_INTERVAL = 60
+
+MAX_AGE_RE = re.compile(r'(?:^|,)\s*(?:s-)?max-age\s*=\s*"?(\d+)"?', re.IGNORECASE)
+
+
+def response_ttl(response, max_ttl=MAX_TTL) -> float:
+    cache_control = response.headers.get('Cache-Control') or ''
+    if 'no-store' in cache_control or 'no-cache' in cache_control:
+        return MIN_TTL
+    match = MAX_AGE_RE.search(cache_control)
+    ttl = int(match.group(1)) if match else DEFAULT_TTL
+    return min(max(ttl, MIN_TTL), max_ttl)
+
+
+class _Entry:
+    def __init__(self, value, ttl):
+        self.value = value
+        self.fetched_at = self.attempted_at = time.monotonic()
+        self.refresh_at = self.fetched_at + ttl * REFRESH_AHEAD
+        self.expires_at = self.fetched_at + ttl
+        self.refreshing = False
+
+
+class DocumentCache:
+    """Process-wide cache of provider JSON documents (discovery, JWKS) keyed by url.
+
+    `fetch` returns the `requests` response of the url, its `Cache-Control` decides
+    the ttl. Entries are refreshed in background before they expire; when a refresh
+    fails, the previous document keeps being served.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        # one per url, a slow provider only holds up the refreshes of its own documents
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _url_lock(self, url):
+        lock = self._locks.get(url)
+        if lock is None:
+            with self._lock:
+                lock = self._locks.setdefault(url, threading.Lock())
+        return lock
+
+    def get(self, url, fetch, max_ttl=MAX_TTL):
+        entry = self._entries.get(url)
+        now = time.monotonic()
+        if entry is None or now >= entry.expires_at:
+            return self._refresh(url, fetch, max_ttl, entry).value
+        if now >= entry.refresh_at and not entry.refreshing:
+            entry.refreshing = True
+            threading.Thread(
+                target=self._refresh, args=(url, fetch, max_ttl, entry), daemon=True,
+                name='social_auth-oidc-refresh',
+            ).start()
+        return entry.value
+
+    def force_refresh(self, url, fetch, max_ttl=MAX_TTL, min_interval=MIN_REFRESH_INTERVAL):
+        entry = self._entries.get(url)
+        # failed attempts count too, a provider outage must not cost a fetch per token
+        if entry is not None and time.monotonic() - entry.attempted_at < min_interval:
+            return entry.value
+        return self._refresh(url, fetch, max_ttl, entry).value
+
+    def _refresh(self, url, fetch, max_ttl, stale):
+        requested_at = time.monotonic()
+        with self._url_lock(url):
+            entry = self._entries.get(url)
+            if entry is not None and entry is not stale:
+                # done by another thread meanwhile
+                return entry
+            if stale is not None and stale.attempted_at >= requested_at:
+                # failed for another thread meanwhile
+                return stale
+            try:
+                response = fetch()
+                entry = _Entry(response.json(), response_ttl(response, max_ttl))
+            except Exception:
+                if stale is None:
+                    raise
+                logger.exception('social_auth oidc document refresh failed, url: %s', url)
+                # keep serving the previous document, retry a bit later
+                stale.attempted_at = time.monotonic()
+                stale.refresh_at = stale.expires_at = max(stale.expires_at, time.monotonic() + MIN_TTL)
+                stale.refreshing = False
+                return stale
+            self._entries[url] = entry
+            logger.info('social_auth oidc document fetched, url: %s', url)
+            return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+document_cache = DocumentCache()
+
+
+def is_oidc_backend(backend_class) -> bool:
+    # module is only around when an OpenID Connect backend is configured (needs extra deps)
+    module = sys.modules.get('social_core.backends.open_id_connect')
+    return module is not None and issubclass(backend_class, module.OpenIdConnectAuth)
+
+
+def unverified_kid(id_token: str):
+    header = id_token.split('.', 1)[0]
+    header += '=' * (-len(header) % 4)
+    try:
+        return json.loads(base64.urlsafe_b64decode(header)).get('kid')
+    except ValueError:
+        return None
+
+
+class OIDCCacheMixin:
+    """Discovery document and JWKS of OpenID Connect backends from the process-wide cache.
+
+    Settings: `OIDC_CACHE_MAX_TTL`, `JWKS_MIN_REFRESH_INTERVAL`
+    """
+
+    def oidc_config(self):
+        endpoint = self.oidc_endpoint() if hasattr(self, 'oidc_endpoint') else self.OIDC_ENDPOINT
+        url = endpoint + '/.well-known/openid-configuration'
+        return document_cache.get(url, lambda: self.request(url), self.setting('OIDC_CACHE_MAX_TTL', MAX_TTL))
+
+    def get_jwks_keys(self):
+        return self.get_remote_jwks_keys()
+
+    def get_remote_jwks_keys(self):
+        url = self.jwks_uri()
+        jwks = document_cache.get(url, lambda: self.request(url), self.setting('OIDC_CACHE_MAX_TTL', MAX_TTL))
+        # copies, `find_valid_key` fills `alg` in
+        return [dict(key) for key in jwks['keys']]
+
+    def find_valid_key(self, id_token):
+        kid = unverified_kid(id_token)
+        if kid is not None and not any(kid == key.get('kid') for key in self.get_jwks_keys()):
+            # key rotated at the provider, refresh, but not on every forged `kid`
+            url = self.jwks_uri()
+            document_cache.force_refresh(
+                url, lambda: self.request(url),
+                self.setting('OIDC_CACHE_MAX_TTL', MAX_TTL),
+                self.setting('JWKS_MIN_REFRESH_INTERVAL', MIN_REFRESH_INTERVAL),
+            )
+            if not any(kid == key.get('kid') for key in self.get_jwks_keys()):
+                return None
+        return super().find_valid_key(id_token)
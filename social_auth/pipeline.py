@@ -0,0 +1,170 @@
+import hashlib
+import logging
+import threading
+
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.db import DEFAULT_DB_ALIAS
+
+from social_core.exceptions import AuthAlreadyAssociated
+from social_core.pipeline.social_auth import social_user as social_core_social_user
+
+from .users import dump_user, ensure_generation, get_generation, load_user, register_generation_alias
+from .writebehind import DEFAULT_INTERVAL, DEFAULT_MAX_SIZE, write_behind
+
+logger = logging.getLogger(__name__)
+
+SOCIAL_USER_KEY = 'social_auth:social_user:{}'
+
+# written by `BaseAuth.extra_data` on every login, not worth a row write on its own
+VOLATILE_EXTRA_DATA = frozenset(('auth_time',))
+
+_stats = {'hit': 0, 'miss': 0}
+_stats_lock = threading.Lock()
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def get_social_user_stats() -> dict:
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _cache():
+    # the one the model signals can reach without plugin settings
+    return caches[DEFAULT_CACHE_ALIAS]
+
+
+def social_user_key(provider, uid) -> str:
+    return SOCIAL_USER_KEY.format(hashlib.sha256(f'{provider}\0{uid}'.encode('utf-8')).hexdigest())
+
+
+def _dump_social(social) -> dict:
+    return {field.attname: getattr(social, field.attname) for field in social._meta.concrete_fields}
+
+
+def _load_social(social_model, snapshot: dict):
+    fields = [field for field in social_model._meta.concrete_fields if field.attname in snapshot]
+    return social_model.from_db(
+        DEFAULT_DB_ALIAS,
+        [field.attname for field in fields],
+        [snapshot[field.attname] for field in fields],
+    )
+
+
+def cache_social(social, ttl, generation):
+    # `generation` read before the user was loaded, see `social_user`
+    entry = (_dump_social(social), dump_user(social.user), generation, ttl)
+    _cache().set(social_user_key(social.provider, social.uid), entry, ttl)
+
+
+def get_cached_social(social_model, provider, uid):
+    entry = _cache().get(social_user_key(provider, uid))
+    if entry is not None:
+        social_snapshot, user_snapshot, generation, _ = entry
+        user = load_user(user_snapshot)
+        if user is not None and generation == get_generation(social_snapshot['user_id']):
+            _count('hit')
+            social = _load_social(social_model, social_snapshot)
+            social.user = user
+            return social
+    _count('miss')
+    return None
+
+
+def refresh_cached_social(social):
+    """Write the saved association through, if it is cached already."""
+    key = social_user_key(social.provider, social.uid)
+    entry = _cache().get(key)
+    if entry is None:
+        return
+    # only with the user at hand, never query for it in a signal
+    if social._meta.get_field('user').is_cached(social):
+        # a user changed since is stale under the generation of the entry already
+        cache_social(social, entry[3], entry[2])
+    else:
+        _cache().delete(key)
+
+
+def invalidate_cached_social(provider, uid):
+    _cache().delete(social_user_key(provider, uid))
+
+
+def social_user(backend, uid, user=None, *args, **kwargs):
+    """Read-through cached `social_core.pipeline.social_auth.social_user`.
+
+    Replaces it in `SOCIAL_AUTH_PIPELINE` and is enabled by `SOCIAL_AUTH_SOCIAL_USER_CACHE_TTL`.
+    """
+    ttl = backend.setting('SOCIAL_USER_CACHE_TTL', 0)
+    if not ttl:
+        return social_core_social_user(backend, uid, user, *args, **kwargs)
+
+    register_generation_alias(DEFAULT_CACHE_ALIAS)
+    provider = backend.name
+    social_model = backend.strategy.storage.user
+    social = get_cached_social(social_model, provider, uid)
+    if social is None:
+        # generation read before the user is loaded: a change committed in between makes
+        # the entry stale instead of caching the user as it was
+        user_id = social_model._default_manager.filter(provider=provider, uid=uid) \
+            .values_list('user_id', flat=True).first()
+        generation = None if user_id is None else ensure_generation(user_id)
+        result = social_core_social_user(backend, uid, user, *args, **kwargs)
+        if result['social'] and generation is not None and result['social'].user_id == user_id:
+            cache_social(result['social'], ttl, generation)
+        return result
+
+    # copy from social_core.pipeline.social_auth.social_user
+    if user and social.user != user:
+        raise AuthAlreadyAssociated(backend)
+    elif not user:
+        user = social.user
+    return {'social': social,
+            'user': user,
+            'is_new': user is None,
+            'new_association': False}
+
+
+def write_behind_enabled(backend) -> bool:
+    return bool(backend.setting('WRITE_BEHIND', False))
+
+
+def write_behind_add(backend, instance, values: dict):
+    write_behind.add(
+        instance, values,
+        interval=backend.setting('WRITE_BEHIND_INTERVAL', DEFAULT_INTERVAL),
+        max_size=backend.setting('WRITE_BEHIND_MAX_SIZE', DEFAULT_MAX_SIZE),
+    )
+
+
+def load_extra_data(backend, details, response, uid, user, *args, **kwargs):
+    """`social_core.pipeline.social_auth.load_extra_data` without the useless writes.
+
+    The row is only saved when extra_data really changed (`auth_time` aside), or
+    buffered with `SOCIAL_AUTH_WRITE_BEHIND`.
+    """
+    social = kwargs.get('social') or \
+        backend.strategy.storage.user.get_social_auth(backend.name, uid)
+    if not social:
+        return
+
+    current = social.extra_data if isinstance(social.extra_data, dict) else {}
+    extra_data = dict(current)
+    extra_data.update(backend.extra_data(user, uid, response, details, *args, **kwargs))
+
+    unchanged = all(
+        current.get(name) == value
+        for name, value in extra_data.items()
+        if name not in VOLATILE_EXTRA_DATA
+    )
+    if write_behind_enabled(backend):
+        if not unchanged:
+            social.extra_data = extra_data
+            write_behind_add(backend, social, {'extra_data': extra_data})
+            # no post_save for buffered writes
+            refresh_cached_social(social)
+    elif not unchanged:
+        social.extra_data = extra_data
+        social.save()
@@ -1,37 +1,48 @@
 import logging
-from saleor.graphql.account.mutations.authentication import RefreshToken, VerifyToken
-from typing import Optional, Tuple
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, List, Optional, Tuple
 
-from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.auth import REDIRECT_FIELD_NAME, get_user_model
 from django.core.exceptions import ValidationError
-from saleor.core.jwt import JWT_REFRESH_TOKEN_COOKIE_NAME, create_access_token, create_refresh_token
 
-import yaml
-from django.contrib.auth import REDIRECT_FIELD_NAME
-from django.core.handlers.wsgi import WSGIRequest
-
-from social_django.strategy import DjangoStrategy
-from social_django.views import _do_login
-from social_core.utils import get_strategy
-
-from saleor.graphql.account.mutations.authentication import _get_new_csrf_token
 from saleor.plugins.base_plugin import BasePlugin, ConfigurationTypeField, ExternalAccessTokens
+from . import metrics
 from . import (
     CONFIG_CODE,
     DEFAULT_BACKEND_CODE,
+    DEFAULT_STATE_STORE,
     EXCHANGE_REDIRECT_URI_CODE,
     SOCIAL_STRATEGY_CODE,
     SOCIAL_STORAGE_CODE,
+    STATE_STORE_CODE,
 )
 
-from .utils import (
-    do_auth,
-    do_complete,
-    validate_storefront_redirect_url,
-)
+from .breaker import OPEN, CircuitOpenError
+from .config import get_settings, invalidate_settings, parse_settings, setting
+from .profiling import profiled
+from .users import register_generation_caches
+
+# saleor imports the plugin module at boot for its discovery, anything else
+# (graphql mutations, social_django, the backends...) is imported on the first hook call
+if TYPE_CHECKING:
+    from django.core.handlers.wsgi import WSGIRequest
+    from social_django.strategy import DjangoStrategy
+
+    from .state import BaseStateStore
 
 logger = logging.getLogger(__name__)
 
+
+@contextmanager
+def fail_fast_on_open_circuit(span):
+    # the provider is known to be down, tell the client right away
+    try:
+        yield
+    except CircuitOpenError as error:
+        span.set_tag('circuit', OPEN)
+        raise ValidationError(str(error))
+
+
 class SocialAuthPlugin(BasePlugin):
     PLUGIN_ID = 'tinaam.authentication.SocialAuthPlugin'
     PLUGIN_NAME = "Social Auth"
@@ -47,6 +58,10 @@ class SocialAuthPlugin(BasePlugin):
             "name": SOCIAL_STORAGE_CODE,
             "value": 'social_django.models.DjangoStorage',
         },
+        {
+            "name": STATE_STORE_CODE,
+            "value": DEFAULT_STATE_STORE,
+        },
         {
             "name": DEFAULT_BACKEND_CODE,
             "value": '',
@@ -68,6 +83,14 @@ class SocialAuthPlugin(BasePlugin):
             "help_text": '`SOCIAL_AUTH_STORAGE` in `python-social-auth` doc',
             "label": "Social Auth Storage",
         },
+        STATE_STORE_CODE: {
+            "type": ConfigurationTypeField.STRING,
+            "help_text": (
+                'Where OAuth state lives between authentication url and token exchange. '
+                '`social_auth.state.CacheStateStore` or `social_auth.state.DBStateStore`'
+            ),
+            "label": "Social Auth State Store",
+        },
         DEFAULT_BACKEND_CODE: {
             "type": ConfigurationTypeField.STRING,
             "help_text": 'Default backend when no variable `backend` in graphql request',
@@ -85,84 +108,198 @@ class SocialAuthPlugin(BasePlugin):
          # self.configuration is an array of dict, just like in the db
         for config in self.configuration:
             config_name = config['name']
-            if config_name == CONFIG_CODE:
-                self.settings = yaml.safe_load(config['value']) or {}
-            else:
+            if config_name != CONFIG_CODE:
                 setattr(self, config_name, config['value'])
+        # parsed once per configuration version and shared across instances
+        self.config_version, self.settings = get_settings(self.configuration)
+        metrics.configure(self.config_version, self.settings)
+        register_generation_caches(self.settings)
 
-        logger.info('SocialAuthPlugin.__init__, settings: %s', self.settings)
+    @classmethod
+    def validate_plugin_configuration(cls, plugin_configuration, **kwargs):
+        configuration = {item['name']: item['value'] for item in plugin_configuration.configuration}
+        parse_settings(configuration.get(CONFIG_CODE))
 
-    def load_strategy(self, request_data: dict, request: WSGIRequest) -> DjangoStrategy:
-        strategy_class_str = getattr(self, SOCIAL_STRATEGY_CODE)
-        storage_class_str = getattr(self, SOCIAL_STORAGE_CODE)
-        strategy = get_strategy(
-            strategy_class_str, storage_class_str,
-            self.settings, request_data,
-            request=request
+    @classmethod
+    def save_plugin_configuration(cls, plugin_configuration, cleaned_data):
+        from .registry import invalidate_registries
+
+        result = super().save_plugin_configuration(plugin_configuration, cleaned_data)
+        invalidate_settings()
+        invalidate_registries()
+        return result
+
+    def get_registry(self):
+        from .registry import get_registry
+
+        return get_registry(
+            self.config_version,
+            getattr(self, SOCIAL_STRATEGY_CODE),
+            getattr(self, SOCIAL_STORAGE_CODE),
+            setting(self.settings, 'AUTHENTICATION_BACKENDS', []),
+            getattr(self, STATE_STORE_CODE, None) or DEFAULT_STATE_STORE,
         )
+
+    def load_state_store(self) -> "BaseStateStore":
+        return self.get_registry().state_store_class(self.settings)
+
+    def load_strategy(self, request_data: dict, request: "WSGIRequest") -> "DjangoStrategy":
+        strategy = self.get_registry().get_strategy(self.settings, request_data, request=request)
         if not hasattr(strategy, 'settings') or not hasattr(strategy, 'req_data'):
+            strategy_class_str = getattr(self, SOCIAL_STRATEGY_CODE)
             raise TypeError(f'`settings` or `req_data` {strategy_class_str} instance are not accessible')
         return strategy
 
-    def load_backend(self, strategy: DjangoStrategy, name: str, redirect_uri: str) -> DjangoStrategy:
-        return strategy.get_backend(name, redirect_uri=redirect_uri)
+    def load_backend(self, strategy: "DjangoStrategy", name: str, redirect_uri: str) -> "DjangoStrategy":
+        return self.get_registry().get_backend(strategy, name, redirect_uri=redirect_uri)
 
     # @patch_session_to_request
     def external_authentication_url(
-        self, data: dict, request: WSGIRequest, previous_value
+        self, data: dict, request: "WSGIRequest", previous_value
+    ) -> dict:
+        backend_str = data.get('backend') or getattr(self, DEFAULT_BACKEND_CODE, '')
+        with profiled(self.settings, 'external_authentication_url', backend_str), \
+             metrics.span('external_authentication_url', backend=backend_str) as span:
+            with fail_fast_on_open_circuit(span):
+                auth_url, state_token, state_data = self.prepare_authentication_url(backend_str, data, request, span)
+            if state_token:
+                with span.stage('state_save'):
+                    self.load_state_store().save(state_token, state_data)
+
+        return {"authorizationUrl": auth_url}
+
+    async def aexternal_authentication_url(
+        self, data: dict, request: "WSGIRequest", previous_value
     ) -> dict:
+        from .aio import run_sync
+
+        # for ASGI callers, the same as `external_authentication_url`
+        backend_str = data.get('backend') or getattr(self, DEFAULT_BACKEND_CODE, '')
+        with metrics.span('external_authentication_url', backend=backend_str) as span:
+            # OpenID Connect backends may fetch the discovery document for the url
+            with fail_fast_on_open_circuit(span):
+                auth_url, state_token, state_data = await run_sync(
+                    self.prepare_authentication_url, backend_str, data, request, span
+                )
+            if state_token:
+                with span.stage('state_save'):
+                    await self.load_state_store().asave(state_token, state_data)
+
+        return {"authorizationUrl": auth_url}
+
+    def prepare_authentication_url(self, backend_str: str, data: dict, request: "WSGIRequest", span):
+        from .state import StateSession
+        from .utils import do_auth, validate_storefront_redirect_url
+
         storefront_redirect_url = data.get("redirectUri")
-        validate_storefront_redirect_url(storefront_redirect_url)
+        with span.stage('validate_redirect'):
+            validate_storefront_redirect_url(storefront_redirect_url)
 
-        session = getattr(request, 'session', None)
         # manually create a session as session is not enabled in saleor -- MIDDLEWARE in settings
-        if not session:
-            session = request.session = SessionStore()
-        strategy = self.load_strategy(data, request)
+        # only the data of it is kept by the state store
+        session = request.session = StateSession()
+        with span.stage('strategy'):
+            strategy = self.load_strategy(data, request)
 
-        backend_str = data.get('backend') or getattr(self, DEFAULT_BACKEND_CODE, '')
-        backend = self.load_backend(
-            strategy,
-            backend_str,
-            storefront_redirect_url
-        )
+        with span.stage('backend'):
+            backend = self.load_backend(
+                strategy,
+                backend_str,
+                storefront_redirect_url
+            )
         if not backend.uses_redirect():
             # for the time being, we only support backend whose`.uses_redirect() == True`
             raise TypeError(f'{backend_str} not support `uses_redirect`')
 
-        # save extra data into session
-        do_auth(backend, redirect_name=REDIRECT_FIELD_NAME)
-        auth_url = backend.auth_url()
+        with span.stage('auth_url'):
+            # save extra data into session
+            do_auth(backend, redirect_name=REDIRECT_FIELD_NAME)
+            auth_url = backend.auth_url()
 
         # save redirect_uri in session for later exchange code request for access token and id token
         strategy.session_set(EXCHANGE_REDIRECT_URI_CODE, storefront_redirect_url)
-        # make session_key as state_token for `external_obtain_access_tokens` retrieval
-        state_token = backend.get_session_state()
-        session._session_key = state_token
-        session.save(must_create=True)
-
-        return {"authorizationUrl": auth_url}
+        # keep session data under state_token for `external_obtain_access_tokens` retrieval
+        return auth_url, backend.get_session_state(), dict(session.items())
 
     # @patch_session_to_request
     def external_obtain_access_tokens(
-        self, data: dict, request: WSGIRequest, previous_value
+        self, data: dict, request: "WSGIRequest", previous_value
     ) -> ExternalAccessTokens:
         # data['code'], data['state'], data['backend']
         # token = self.oauth.fetch_access_token()
-        state_token = data.get('state')
-        if state_token is None:
-            raise ValidationError('Missing needed parameter `state`')
-        session = request.session = SessionStore(session_key=state_token)
-        strategy = self.load_strategy(data, request)
-        redirect_uri = strategy.session_get(EXCHANGE_REDIRECT_URI_CODE)
+        backend_str = data.get('backend') or getattr(self, DEFAULT_BACKEND_CODE, '')
+        with profiled(self.settings, 'external_obtain_access_tokens', backend_str), \
+             metrics.span('external_obtain_access_tokens', backend=backend_str) as span:
+            state_token = data.get('state')
+            if state_token is None:
+                raise ValidationError('Missing needed parameter `state`')
+            # held while exchanging, the same state can not be exchanged twice at once
+            state_store = self.load_state_store()
+            with span.stage('state_claim'):
+                state_data = state_store.claim(state_token)
+            try:
+                backend = self.prepare_backend(backend_str, data, request, state_data or {}, span)
+                # upstream token exchange and pipeline, the exchange alone is `social_auth.http.request`
+                with span.stage('complete'), fail_fast_on_open_circuit(span):
+                    user = self.complete(backend, backend_str, data, request)
+            except BaseException:
+                # a failed exchange (provider down, timeout...) may be retried with the same state
+                if state_data is not None:
+                    state_store.release(state_token, state_data)
+                raise
+            if state_data is not None:
+                with span.stage('state_delete'):
+                    state_store.delete(state_token)
+            with span.stage('tokens'):
+                return self.create_tokens(user, request)
+
+    async def aexternal_obtain_access_tokens(
+        self, data: dict, request: "WSGIRequest", previous_value
+    ) -> ExternalAccessTokens:
+        from .aio import run_sync
 
+        # for ASGI callers, the same as `external_obtain_access_tokens`
         backend_str = data.get('backend') or getattr(self, DEFAULT_BACKEND_CODE, '')
-        backend = self.load_backend(
-            strategy,
-            backend_str,
-            redirect_uri
-        )
-        user = do_complete(backend, _do_login, user=request.user, request=request)
+        with metrics.span('external_obtain_access_tokens', backend=backend_str) as span:
+            state_token = data.get('state')
+            if state_token is None:
+                raise ValidationError('Missing needed parameter `state`')
+            state_store = self.load_state_store()
+            with span.stage('state_claim'):
+                state_data = await state_store.aclaim(state_token)
+            try:
+                backend = self.prepare_backend(backend_str, data, request, state_data or {}, span)
+                with span.stage('complete'), fail_fast_on_open_circuit(span):
+                    user = await self.acomplete(backend, backend_str, data, request)
+            except BaseException:
+                if state_data is not None:
+                    await state_store.arelease(state_token, state_data)
+                raise
+            if state_data is not None:
+                with span.stage('state_delete'):
+                    await state_store.adelete(state_token)
+            with span.stage('tokens'):
+                return await run_sync(self.create_tokens, user, request)
+
+    def prepare_backend(self, backend_str: str, data: dict, request: "WSGIRequest", state_data: dict, span):
+        from .state import StateSession
+
+        session = request.session = StateSession()
+        session.update(state_data)
+        with span.stage('strategy'):
+            strategy = self.load_strategy(data, request)
+        redirect_uri = strategy.session_get(EXCHANGE_REDIRECT_URI_CODE)
+
+        with span.stage('backend'):
+            return self.load_backend(
+                strategy,
+                backend_str,
+                redirect_uri
+            )
+
+    def create_tokens(self, user, request: "WSGIRequest") -> ExternalAccessTokens:
+        from saleor.core.jwt import create_access_token, create_refresh_token
+        from saleor.graphql.account.mutations.authentication import _get_new_csrf_token
 
         # copied from
         # saleor/graphql/account/mutations/authentication.py:CreateToken.perform_mutation
@@ -171,12 +308,10 @@ class SocialAuthPlugin(BasePlugin):
         refresh_token = create_refresh_token(user, {"csrfToken": csrf_token})
         request.refresh_token = refresh_token
         request._cached_user = user
-        # this will be done via _do_login
+        # this will be done via do_login
         # user.last_login = timezone.now()
         # user.save(update_fields=["last_login"])
 
-        # session is not need any more under spa
-        session.delete()
         return ExternalAccessTokens(
             token=access_token,
             refresh_token=refresh_token,
@@ -184,7 +319,50 @@ class SocialAuthPlugin(BasePlugin):
             user=user,
         )
 
-    def request_data(self, request: WSGIRequest, merge=True):
+    @staticmethod
+    def single_flight_key(single_flight, backend, backend_str: str, data: dict) -> str:
+        # a replay of the code with another state must not get the user of the first one,
+        # it goes through the state validation on its own. backends without state
+        # (weixin-weapp) never look at it, a client-sent one must not split their key
+        state = (data.get('state') or '') if backend.STATE_PARAMETER or backend.REDIRECT_STATE else ''
+        return single_flight.make_key(backend_str, data.get('code'), state)
+
+    def complete(self, backend, backend_str: str, data: dict, request: "WSGIRequest"):
+        from .singleflight import SingleFlight
+        from .utils import do_complete, do_login
+
+        # clients retry with the same `code`, yet only the first exchange of it succeeds
+        code = data.get('code')
+        single_flight = SingleFlight(self.settings)
+        if not code or not single_flight.enabled:
+            return do_complete(backend, do_login, user=request.user, request=request)
+
+        user_model = get_user_model()
+        return single_flight.do(
+            self.single_flight_key(single_flight, backend, backend_str, data),
+            lambda: do_complete(backend, do_login, user=request.user, request=request),
+            dump=lambda user: user.pk if isinstance(user, user_model) else None,
+            load=lambda pk: user_model._default_manager.get(pk=pk),
+        )
+
+    async def acomplete(self, backend, backend_str: str, data: dict, request: "WSGIRequest"):
+        from .singleflight import SingleFlight
+        from .utils import ado_complete, do_login
+
+        code = data.get('code')
+        single_flight = SingleFlight(self.settings)
+        if not code or not single_flight.enabled:
+            return await ado_complete(backend, do_login, user=request.user, request=request)
+
+        user_model = get_user_model()
+        return await single_flight.ado(
+            self.single_flight_key(single_flight, backend, backend_str, data),
+            lambda: ado_complete(backend, do_login, user=request.user, request=request),
+            dump=lambda user: user.pk if isinstance(user, user_model) else None,
+            load=lambda pk: user_model._default_manager.get(pk=pk),
+        )
+
+    def request_data(self, request: "WSGIRequest", merge=True):
         # copy from social_django.strategy.DjangoStrategy.request_data
         if not request:
             return {}
@@ -198,8 +376,13 @@ class SocialAuthPlugin(BasePlugin):
         return data
 
     def external_refresh(
-        self, data: dict, request: WSGIRequest, previous_value
+        self, data: dict, request: "WSGIRequest", previous_value
     ) -> ExternalAccessTokens:
+        from saleor.core.jwt import JWT_REFRESH_TOKEN_COOKIE_NAME, create_access_token
+        from saleor.graphql.account.mutations.authentication import RefreshToken
+
+        from .verify import RefreshCache
+
         # utilize existing code
         # create an object that can have arbitrary attrs, refer to
         # https://stackoverflow.com/questions/2280334/shortest-way-of-creating-an-object-with-arbitrary-attributes-in-python
@@ -228,16 +411,35 @@ class SocialAuthPlugin(BasePlugin):
         # by debug, it's `refreshToken` instead of `refresh_token`
         refresh_token_code = 'refreshToken'
         refresh_token = data.get(refresh_token_code) or refresh_token
-        payload = RefreshToken.clean_refresh_token(refresh_token)
+        refresh_cache = RefreshCache(self.settings)
+        with profiled(self.settings, 'external_refresh'), metrics.span('external_refresh') as span:
+            cached = None
+            if refresh_cache.enabled:
+                with span.stage('cache'):
+                    cached = refresh_cache.get(refresh_token)
+                span.set_tag('cache', 'hit' if cached is not None else 'miss')
+
+            with span.stage('decode'):
+                if cached is not None:
+                    user, payload = cached
+                else:
+                    payload = RefreshToken.clean_refresh_token(refresh_token)
 
-        # None when we got refresh_token from cookie.
-        csrf_token = None
-        if not data.get(refresh_token_code):
-            csrf_token = data.get(refresh_token_code)
-            RefreshToken.clean_csrf_token(csrf_token, payload)
+                # None when we got refresh_token from cookie.
+                csrf_token = None
+                if not data.get(refresh_token_code):
+                    csrf_token = data.get(refresh_token_code)
+                    RefreshToken.clean_csrf_token(csrf_token, payload)
 
-        user = RefreshToken.get_user(payload)
-        token = create_access_token(user)
+            if cached is None:
+                generation = refresh_cache.generation(payload) if refresh_cache.enabled else None
+                with span.stage('user'):
+                    user = RefreshToken.get_user(payload)
+                if refresh_cache.enabled and user:
+                    refresh_cache.set(refresh_token, user, payload, generation)
+            with span.stage('tokens'):
+                # saleor's jwt manager keeps its keys loaded already
+                token = create_access_token(user)
         return ExternalAccessTokens(
             token=token,
             refresh_token=refresh_token,
@@ -246,9 +448,48 @@ class SocialAuthPlugin(BasePlugin):
         )
 
     def external_verify(
-        self, data: dict, request: WSGIRequest, previous_value
+        self, data: dict, request: "WSGIRequest", previous_value
     ) -> Tuple[Optional["User"], dict]:
-        # utilize existing code
-        payload = VerifyToken.get_payload(data['token'])
-        user = VerifyToken.get_user(payload)
+        from saleor.graphql.account.mutations.authentication import VerifyToken
+
+        from .verify import VerifyCache
+
+        token = data['token']
+        verify_cache = VerifyCache(self.settings)
+        with profiled(self.settings, 'external_verify'), metrics.span('external_verify') as span:
+            if verify_cache.enabled:
+                with span.stage('cache'):
+                    cached = verify_cache.get(token)
+                span.set_tag('cache', 'hit' if cached is not None else 'miss')
+                if cached is not None:
+                    return cached
+
+            # utilize existing code
+            with span.stage('decode'):
+                payload = VerifyToken.get_payload(token)
+            generation = verify_cache.generation(payload) if verify_cache.enabled else None
+            with span.stage('user'):
+                user = VerifyToken.get_user(payload)
+            if verify_cache.enabled and user:
+                verify_cache.set(token, user, payload, generation)
         return user, payload
+
+    def external_verify_batch(self, tokens: List[str]) -> List[Tuple[Optional["User"], Optional[dict], Optional[ValidationError]]]:
+        from .verify import VerifyCache, verify_tokens
+
+        # for gateways checking many bearer tokens at once,
+        # `[(user, payload, error), ...]` in order of `tokens`
+        return verify_tokens(tokens, VerifyCache(self.settings))
+
+    def customer_updated(self, customer, previous_value, **kwargs):
+        # saleor's bulk (de)activations go through `QuerySet.update()`, no `post_save` there
+        from .users import bump_generation
+
+        bump_generation(customer.pk)
+        return previous_value
+
+    def staff_updated(self, staff_user, previous_value, **kwargs):
+        from .users import bump_generation
+
+        bump_generation(staff_user.pk)
+        return previous_value
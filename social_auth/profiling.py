@@ -0,0 +1,179 @@
+import heapq
+import io
+import itertools
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.db import connections
+
+from .config import setting
+
+logger = logging.getLogger(__name__)
+
+PROFILES_KEY = 'social_auth:profiles'
+DEFAULT_PROFILE_TOP = 10
+DEFAULT_PROFILE_LINES = 40
+DEFAULT_PROFILE_CACHE_TTL = 86400
+
+# one profiler at a time, cProfile can not run two at once in a process since python 3.12
+_profiler_lock = threading.Lock()
+
+# (hook, backend) -> min heap of (duration, seq, entry), the slowest calls are kept
+_profiles = {}
+_profiles_lock = threading.Lock()
+_seq = itertools.count()
+
+
+class QueryCounter:
+    """`execute_wrapper` counting the queries of the profiled call and their time."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - start
+
+
+def profile_key(hook: str, backend: str) -> str:
+    return f'{hook}:{backend or "-"}'
+
+
+def _keep_slowest(entries: list, entry: dict, top: int) -> list:
+    entries = sorted(entries + [entry], key=lambda item: item['duration_ms'], reverse=True)
+    return entries[:top]
+
+
+def record_profile(entry: dict, top: int = DEFAULT_PROFILE_TOP, cache_alias: str = None,
+                   cache_ttl: int = DEFAULT_PROFILE_CACHE_TTL):
+    """Keep `entry` if it is one of the `top` slowest of its hook & backend, in this
+    process and, best effort, in the `cache_alias` cache shared with the other workers."""
+    key = profile_key(entry['hook'], entry['backend'])
+    with _profiles_lock:
+        heap = _profiles.setdefault(key, [])
+        item = (entry['duration_ms'], next(_seq), entry)
+        if len(heap) < top:
+            heapq.heappush(heap, item)
+        elif item[0] > heap[0][0]:
+            heapq.heapreplace(heap, item)
+        else:
+            return
+
+    if cache_alias is None:
+        return
+    # read-modify-write, a sample of another worker at the very same time may be lost
+    cache = caches[cache_alias]
+    shared = cache.get(PROFILES_KEY) or {}
+    shared[key] = _keep_slowest(shared.get(key, []), entry, top)
+    cache.set(PROFILES_KEY, shared, cache_ttl)
+
+
+def get_profiles() -> dict:
+    """`{'<hook>:<backend>': [entry, ...]}` of this process, slowest first."""
+    with _profiles_lock:
+        return {
+            key: [entry for _, _, entry in sorted(heap, key=lambda item: item[0], reverse=True)]
+            for key, heap in _profiles.items()
+        }
+
+
+def get_shared_profiles(cache_alias: str = DEFAULT_CACHE_ALIAS) -> dict:
+    """Same as `get_profiles`, merged over the workers sharing the cache."""
+    return caches[cache_alias].get(PROFILES_KEY) or {}
+
+
+def clear_profiles(cache_alias: str = None):
+    with _profiles_lock:
+        _profiles.clear()
+    if cache_alias is not None:
+        caches[cache_alias].delete(PROFILES_KEY)
+
+
+def _format_stats(profiler, lines: int) -> str:
+    import pstats
+
+    stream = io.StringIO()
+    pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(lines)
+    return stream.getvalue()
+
+
+@contextmanager
+def profiled(settings: dict, hook: str, backend: str = ''):
+    """cProfile a `SOCIAL_AUTH_PROFILE_RATE` fraction of the hook calls (0, the default,
+    disables it), queries of all the databases counted.
+
+    The `SOCIAL_AUTH_PROFILE_TOP` slowest of every hook & backend are kept with their
+    `SOCIAL_AUTH_PROFILE_LINES` costliest functions (cumulative time), see `get_profiles`
+    and the `social_auth_profiles` command. A call arriving while another one is being
+    profiled is not sampled.
+    """
+    rate = setting(settings, 'PROFILE_RATE', 0)
+    if not rate or random.random() >= rate or not _profiler_lock.acquire(blocking=False):
+        yield
+        return
+
+    import cProfile
+
+    try:
+        counter = QueryCounter()
+        profiler = cProfile.Profile()
+        outcome = 'ok'
+        start = time.perf_counter()
+        try:
+            profiler.enable()
+        except ValueError:
+            # some other profiling tool is active
+            yield
+            return
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            try:
+                yield
+            except BaseException:
+                outcome = 'error'
+                raise
+            finally:
+                profiler.disable()
+                _record_sample(settings, hook, backend, profiler, counter, time.perf_counter() - start, outcome)
+    finally:
+        _profiler_lock.release()
+
+
+def _record_sample(settings: dict, hook: str, backend: str, profiler, counter: QueryCounter, duration: float,
+                   outcome: str):
+    # never let the sampling fail the hook call itself
+    try:
+        entry = {
+            'hook': hook,
+            'backend': backend,
+            'duration_ms': round(duration * 1000, 3),
+            'queries': counter.count,
+            'sql_ms': round(counter.duration * 1000, 3),
+            'outcome': outcome,
+            'at': time.time(),
+            'pid': os.getpid(),
+            'profile': _format_stats(profiler, setting(settings, 'PROFILE_LINES', DEFAULT_PROFILE_LINES)),
+        }
+        record_profile(
+            entry,
+            top=setting(settings, 'PROFILE_TOP', DEFAULT_PROFILE_TOP),
+            cache_alias=setting(settings, 'PROFILE_CACHE_ALIAS', DEFAULT_CACHE_ALIAS),
+            cache_ttl=setting(settings, 'PROFILE_CACHE_TTL', DEFAULT_PROFILE_CACHE_TTL),
+        )
+        logger.info(
+            'social_auth profile sampled, hook: %s, backend: %s, duration: %.1f ms, queries: %s, outcome: %s',
+            hook, backend, entry['duration_ms'], entry['queries'], outcome,
+        )
+    except Exception:
+        logger.exception('social_auth profile not recorded, hook: %s, backend: %s', hook, backend)
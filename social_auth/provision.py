@@ -0,0 +1,187 @@
+import csv
+import json
+import logging
+import os
+import time
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import FieldDoesNotExist
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_IMPORT_CHUNK_SIZE = 1000
+# records read, users & associations created, associations already there, unusable records
+COUNTS = ('records', 'users', 'accounts', 'existing', 'skipped')
+
+
+def read_records(path: str, fmt: str = None, start: int = 0):
+    """Provider responses of a CSV (header row, e.g. `openid,unionid`) or JSONL file,
+    streamed from the `start`th record on. Empty CSV cells are missing fields."""
+    if fmt is None:
+        fmt = 'jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv'
+    with open(path, newline='', encoding='utf-8') as file:
+        if fmt == 'csv':
+            records = (
+                {name: value for name, value in row.items() if name and value not in (None, '')}
+                for row in csv.DictReader(file)
+            )
+        else:
+            records = (json.loads(line) for line in file if line.strip())
+        yield from islice(records, start, None)
+
+
+def load_checkpoint(path: str) -> dict:
+    try:
+        with open(path, encoding='utf-8') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+
+
+def save_checkpoint(path: str, checkpoint: dict):
+    # a crash while writing leaves the previous checkpoint
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        json.dump(checkpoint, file)
+    os.replace(tmp_path, path)
+
+
+def user_fields(user_model, details: dict) -> dict:
+    # same fields `social_django.storage.DjangoUserMixin.create_user` hands to the manager
+    fields = {'username': details['username'], 'email': details.get('email')}
+    username_field = getattr(user_model, 'USERNAME_FIELD', 'username')
+    if username_field not in fields:
+        fields[username_field] = fields.pop('username')
+    else:
+        try:
+            user_model._meta.get_field('username')
+        except FieldDoesNotExist:
+            fields.pop('username')
+    if fields.get('email'):
+        fields['email'] = user_model._default_manager.normalize_email(fields['email'])
+    return fields
+
+
+def import_accounts(backend, records, using: str = DEFAULT_DB_ALIAS) -> dict:
+    """Create the users & associations `backend` would for these provider responses,
+    one transaction, return the counts.
+
+    Username, email, uid and extra data come from the backend itself
+    (`get_user_details`, `get_user_id`, `extra_data`). Users are matched on their
+    `USERNAME_FIELD` (the email in Saleor), existing users & associations are kept
+    as they are, so a chunk can be imported again.
+    """
+    social_model = backend.strategy.storage.user
+    user_model = get_user_model()
+    username_field = getattr(user_model, 'USERNAME_FIELD', 'username')
+    counts = dict.fromkeys(COUNTS, 0)
+
+    accounts = {}
+    for response in records:
+        counts['records'] += 1
+        details = backend.get_user_details(response)
+        if not details.get('username'):
+            counts['skipped'] += 1
+            continue
+        uid = backend.get_user_id(details, response)
+        fields = user_fields(user_model, details)
+        if not uid or not fields.get(username_field):
+            counts['skipped'] += 1
+            continue
+        if uid in accounts:
+            # the last record of a uid wins, every record lands in one of the counts
+            counts['skipped'] += 1
+        # `auth_time` & co, as stored by a login
+        accounts[uid] = (fields, backend.extra_data(None, uid, response, details))
+    if not accounts:
+        return counts
+
+    users = user_model._default_manager.db_manager(using)
+    socials = social_model._default_manager.db_manager(using)
+    usernames = {fields[username_field] for fields, _ in accounts.values()}
+    with transaction.atomic(using=using):
+        known = set(
+            socials.filter(provider=backend.name, uid__in=list(accounts)).values_list('uid', flat=True)
+        )
+        existing = dict(users.filter(**{f'{username_field}__in': usernames}).values_list(username_field, 'pk'))
+
+        new_users = {}
+        for uid, (fields, _) in accounts.items():
+            if uid in known or fields[username_field] in existing or fields[username_field] in new_users:
+                continue
+            user = user_model(**fields)
+            user.set_unusable_password()
+            new_users[fields[username_field]] = user
+        if new_users:
+            # no pks back with ignore_conflicts, they are read again below
+            users.bulk_create(new_users.values(), ignore_conflicts=True)
+            user_pks = dict(
+                users.filter(**{f'{username_field}__in': list(new_users)}).values_list(username_field, 'pk')
+            )
+            counts['users'] = len(user_pks)
+            existing.update(user_pks)
+
+        new_socials = [
+            social_model(user_id=existing[fields[username_field]], provider=backend.name, uid=uid, extra_data=extra_data)
+            for uid, (fields, extra_data) in accounts.items()
+            if uid not in known and fields[username_field] in existing
+        ]
+        socials.bulk_create(new_socials, ignore_conflicts=True)
+        # the conflicts are skipped silently (e.g. a login got in first), count what is stored
+        stored = dict(
+            socials.filter(provider=backend.name, uid__in=[social.uid for social in new_socials])
+            .values_list('uid', 'user_id')
+        )
+        counts['accounts'] = sum(1 for social in new_socials if stored.get(social.uid) == social.user_id)
+    counts['existing'] = len(known) + len(stored) - counts['accounts']
+    counts['skipped'] += len(accounts) - counts['existing'] - counts['accounts']
+
+    metrics.incr('import.users', counts['users'], backend=backend.name)
+    metrics.incr('import.accounts', counts['accounts'], backend=backend.name)
+    return counts
+
+
+def import_file(
+    backend,
+    path: str,
+    fmt: str = None,
+    chunk_size: int = DEFAULT_IMPORT_CHUNK_SIZE,
+    checkpoint_path: str = None,
+    using: str = DEFAULT_DB_ALIAS,
+    progress=None,
+) -> dict:
+    """`import_accounts` over a whole file, `chunk_size` records per transaction.
+
+    The totals are written to `checkpoint_path` after every chunk, an import
+    started again with the same checkpoint goes on after the last committed chunk.
+    `progress(totals, elapsed)` is called after every chunk too.
+    """
+    checkpoint = load_checkpoint(checkpoint_path) if checkpoint_path else {}
+    if checkpoint and checkpoint.get('path') != os.path.abspath(path):
+        raise ValueError(f'checkpoint {checkpoint_path} is the one of {checkpoint.get("path")}')
+    totals = {**dict.fromkeys(COUNTS, 0), **checkpoint.get('totals', {})}
+    if totals['records']:
+        logger.info('social_auth import resumed, path: %s, records: %s', path, totals['records'])
+
+    start = time.perf_counter()
+    records = read_records(path, fmt, start=totals['records'])
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            break
+        for name, count in import_accounts(backend, chunk, using=using).items():
+            totals[name] += count
+        if checkpoint_path:
+            save_checkpoint(checkpoint_path, {'path': os.path.abspath(path), 'totals': totals})
+        if progress is not None:
+            progress(totals, time.perf_counter() - start)
+
+    logger.info(
+        'social_auth import done, path: %s, totals: %s, elapsed: %.3f sec',
+        path, totals, time.perf_counter() - start,
+    )
+    return totals
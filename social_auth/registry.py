@@ -0,0 +1,98 @@
+import logging
+from collections import OrderedDict
+from functools import cached_property
+
+from social_core.backends.base import BaseAuth
+from social_core.backends.oauth import BaseOAuth2
+from social_core.backends.utils import get_backend
+from social_core.utils import module_member
+
+from . import DEFAULT_STATE_STORE
+from .aio import AsyncOAuth2Mixin
+from .http_pool import PooledHTTPMixin
+from .lru import BoundedLRU
+from .oidc import OIDCCacheMixin, is_oidc_backend
+from .pipeline_runner import CompiledPipelineMixin
+
+logger = logging.getLogger(__name__)
+
+REGISTRY_CACHE_SIZE = 32
+
+# behaviours configured backends get, including the ones from `social_core`,
+# (mixin, whether it applies to the backend class)
+BACKEND_MIXINS = (
+    (PooledHTTPMixin, lambda backend_class: True),
+    (AsyncOAuth2Mixin, lambda backend_class: issubclass(backend_class, BaseOAuth2)),
+    (OIDCCacheMixin, is_oidc_backend),
+    (CompiledPipelineMixin, lambda backend_class: True),
+)
+
+
+def with_backend_mixins(backend_class):
+    mixins = tuple(
+        mixin for mixin, applies in BACKEND_MIXINS
+        if applies(backend_class) and not issubclass(backend_class, mixin)
+    )
+    if not mixins:
+        return backend_class
+    # keep module and name, `_do_login` stores them as `user.backend`
+    return type(backend_class.__name__, mixins + (backend_class,), {
+        '__module__': backend_class.__module__,
+        '__qualname__': backend_class.__qualname__,
+    })
+
+_registry_cache = BoundedLRU(REGISTRY_CACHE_SIZE)
+
+
+class Registry:
+    """Strategy, storage and backend classes resolved for one configuration version."""
+
+    def __init__(self, strategy_class_str: str, storage_class_str: str, backend_class_strs,
+                 state_store_class_str: str = DEFAULT_STATE_STORE):
+        self.strategy_class = module_member(strategy_class_str)
+        self.storage_class = module_member(storage_class_str)
+        self.state_store_class_str = state_store_class_str or DEFAULT_STATE_STORE
+        self.backend_class_strs = list(backend_class_strs or [])
+        self.backends = OrderedDict()
+        for backend_class_str in self.backend_class_strs:
+            backend_class = module_member(backend_class_str)
+            if issubclass(backend_class, BaseAuth):
+                self.backends[backend_class.name] = with_backend_mixins(backend_class)
+
+    @cached_property
+    def state_store_class(self):
+        return module_member(self.state_store_class_str)
+
+    def get_strategy(self, settings: dict, request_data: dict, request=None):
+        strategy = self.strategy_class(self.storage_class, settings, request_data, request=request)
+        # let strategy.get_backend() skip `social_core.backends.utils.load_backends`
+        strategy.registry = self
+        return strategy
+
+    def get_backend_class(self, name: str):
+        try:
+            return self.backends[name]
+        except KeyError:
+            # raises the social_core's own missing backend error
+            return with_backend_mixins(get_backend(self.backend_class_strs, name))
+
+    def get_backend(self, strategy, name: str, redirect_uri: str = None):
+        return self.get_backend_class(name)(strategy, redirect_uri=redirect_uri)
+
+
+def get_registry(version: str, strategy_class_str: str, storage_class_str: str, backend_class_strs,
+                 state_store_class_str: str = DEFAULT_STATE_STORE) -> Registry:
+    key = (version, strategy_class_str, storage_class_str, state_store_class_str)
+    registry = _registry_cache.get(key)
+    if registry is not None:
+        return registry
+
+    registry = Registry(strategy_class_str, storage_class_str, backend_class_strs, state_store_class_str)
+    logger.info('social_auth registry built, version: %s, backends: %s', version, list(registry.backends))
+
+    _registry_cache.set(key, registry)
+    return registry
+
+
+def invalidate_registries():
+    _registry_cache.clear()
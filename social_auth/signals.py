@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .pipeline import invalidate_cached_social, refresh_cached_social
+from .users import IGNORED_UPDATE_FIELDS, bump_generation, generations_enabled
+
+
+def bump_generation_on_commit(user_pk, using):
+    if not generations_enabled():
+        # no user cache on, the default
+        return
+    bump_generation(user_pk)
+    if transaction.get_connection(using).in_atomic_block:
+        # a user read by another request before the commit is still the old one,
+        # it must not be cached under the generation of right now
+        transaction.on_commit(lambda: bump_generation(user_pk), using=using)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def invalidate_user_caches_on_save(sender, instance, update_fields=None, using=None, **kwargs):
+    # deactivation, password change (new `jwt_token_key`)... but not the login bookkeeping
+    if update_fields and IGNORED_UPDATE_FIELDS.issuperset(update_fields):
+        return
+    bump_generation_on_commit(instance.pk, using)
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def invalidate_user_caches_on_delete(sender, instance, using=None, **kwargs):
+    bump_generation_on_commit(instance.pk, using)
+
+
+@receiver(post_save, sender='social_django.UserSocialAuth')
+def refresh_social_user_on_save(sender, instance, **kwargs):
+    refresh_cached_social(instance)
+
+
+@receiver(post_delete, sender='social_django.UserSocialAuth')
+def invalidate_social_user_on_delete(sender, instance, **kwargs):
+    # disconnect, or the cascade of a user deletion
+    invalidate_cached_social(instance.provider, instance.uid)
@@ -0,0 +1,176 @@
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+import weakref
+
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+
+from .aio import run_sync
+from .config import setting
+
+logger = logging.getLogger(__name__)
+
+# opt-in, see `SingleFlight`
+DEFAULT_RESULT_TTL = 0
+DEFAULT_WAIT_TIMEOUT = 10
+POLL_INTERVAL = 0.05
+
+_calls = {}
+_calls_lock = threading.Lock()
+# futures of the async leaders, per event loop
+_acalls = weakref.WeakKeyDictionary()
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.failed = False
+
+
+class SingleFlight:
+    """Let concurrent and near-simultaneous calls of the same key share one execution.
+
+    Threads of a process wait on the in-process leader, processes coordinate through
+    a lock in the django cache and pick the leader's result up from there.
+    The cross process result goes through `dump`/`load`, e.g. a user instance <-> its pk.
+
+    Only successes are shared, for `SOCIAL_AUTH_SINGLE_FLIGHT_TTL` seconds (0, the default,
+    disables it): after a failure the next caller runs `func` on its own, a transient error
+    (timeout, open circuit...) must not fail a retry that could still succeed.
+    Whoever knows the key gets the result, so the key has to include every credential
+    of the call (code & state of a login), not only what identifies it.
+    """
+
+    key_prefix = 'social_auth:singleflight:'
+
+    def __init__(self, settings: dict):
+        self.ttl = setting(settings, 'SINGLE_FLIGHT_TTL', DEFAULT_RESULT_TTL)
+        self.wait_timeout = setting(settings, 'SINGLE_FLIGHT_WAIT', DEFAULT_WAIT_TIMEOUT)
+        self.cache = caches[setting(settings, 'SINGLE_FLIGHT_CACHE_ALIAS', DEFAULT_CACHE_ALIAS)]
+
+    @property
+    def enabled(self):
+        return bool(self.ttl)
+
+    @staticmethod
+    def make_key(*parts) -> str:
+        # never keep raw authorization codes around
+        return hashlib.sha256('\0'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+    def do(self, key: str, func, dump=lambda value: value, load=lambda value: value):
+        if not self.enabled:
+            return func()
+
+        with _calls_lock:
+            call = _calls.get(key)
+            leader = call is None
+            if leader:
+                call = _calls[key] = _Call()
+
+        if not leader:
+            call.event.wait()
+            if call.failed:
+                # the leader's failure is its own, try again
+                return self.do(key, func, dump, load)
+            return call.result
+
+        try:
+            call.result = self._do_shared(key, func, dump, load)
+            return call.result
+        except Exception:
+            call.failed = True
+            raise
+        finally:
+            with _calls_lock:
+                _calls.pop(key, None)
+            call.event.set()
+
+    def _do_shared(self, key, func, dump, load):
+        result_key = f'{self.key_prefix}result:{key}'
+        lock_key = f'{self.key_prefix}lock:{key}'
+
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            outcome = self.cache.get(result_key)
+            if outcome is not None:
+                logger.info('social_auth single flight hit, key: %s', key)
+                return self._unpack(outcome, load)
+            if self.cache.add(lock_key, 1, self.wait_timeout):
+                break
+            if time.monotonic() >= deadline:
+                # leader is stuck or gone, do it on our own
+                return func()
+            time.sleep(POLL_INTERVAL)
+
+        try:
+            value = func()
+            dumped = dump(value)
+            if dumped is not None:
+                self.cache.set(result_key, ('ok', dumped), self.ttl)
+            return value
+        finally:
+            self.cache.delete(lock_key)
+
+    async def ado(self, key: str, func, dump=lambda value: value, load=lambda value: value):
+        """`do()` for a coroutine function `func`, awaited by the callers of one event loop."""
+        if not self.enabled:
+            return await func()
+
+        calls = _acalls.setdefault(asyncio.get_running_loop(), {})
+        future = calls.get(key)
+        if future is not None:
+            try:
+                # shielded, a cancelled waiter must not cancel the leader's result for the others
+                return await asyncio.shield(future)
+            except Exception:
+                # the leader's failure is its own, try again
+                return await self.ado(key, func, dump, load)
+
+        future = calls[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await self._ado_shared(key, func, dump, load)
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as error:
+            future.set_exception(error)
+            # retrieved here in case nobody else waits on it
+            future.exception()
+            raise
+        finally:
+            calls.pop(key, None)
+
+    async def _ado_shared(self, key, func, dump, load):
+        result_key = f'{self.key_prefix}result:{key}'
+        lock_key = f'{self.key_prefix}lock:{key}'
+
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            outcome = await run_sync(self.cache.get, result_key)
+            if outcome is not None:
+                logger.info('social_auth single flight hit, key: %s', key)
+                return await run_sync(self._unpack, outcome, load)
+            if await run_sync(self.cache.add, lock_key, 1, self.wait_timeout):
+                break
+            if time.monotonic() >= deadline:
+                return await func()
+            await asyncio.sleep(POLL_INTERVAL)
+
+        try:
+            value = await func()
+            dumped = await run_sync(dump, value)
+            if dumped is not None:
+                await run_sync(self.cache.set, result_key, ('ok', dumped), self.ttl)
+            return value
+        finally:
+            await run_sync(self.cache.delete, lock_key)
+
+    @staticmethod
+    def _unpack(outcome, load):
+        _, value = outcome
+        return load(value)
@@ -0,0 +1,325 @@
+import hashlib
+import logging
+import time
+
+from django.contrib.sessions.backends.base import CreateError, SessionBase
+from django.contrib.sessions.backends.db import SessionStore as DBSessionStore
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+from . import metrics
+
+from .aio import run_sync
+from .config import setting
+
+logger = logging.getLogger(__name__)
+
+# seconds an unfinished login (authorization url issued, no code exchanged yet) is kept
+DEFAULT_STATE_TIMEOUT = 600
+
+# seconds a state is held by the exchange claiming it, one that crashed frees it that late
+DEFAULT_STATE_CLAIM_TIMEOUT = 60
+
+# `django_session.session_key` is a varchar(40)
+SESSION_KEY_MAX_LENGTH = 40
+DEFAULT_PURGE_BATCH_SIZE = 1000
+DEFAULT_PURGE_SLEEP = 0.1
+
+
+class StateSession(SessionBase):
+    """In-memory session backing the strategy during a single hook call.
+
+    `python-social-auth` and `django.contrib.auth.login` expect a session on the
+    request, but nothing of it outlives the hook call except the data handed
+    over to the state store.
+    """
+
+    def exists(self, session_key):
+        return False
+
+    def create(self):
+        self._session_key = self._get_new_session_key()
+        self.modified = True
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            self.create()
+
+    def delete(self, session_key=None):
+        pass
+
+    def load(self):
+        return {}
+
+
+class BaseStateStore:
+    """Keeps the session data of `external_authentication_url` under its state token
+    until `external_obtain_access_tokens` picks it up."""
+
+    def __init__(self, settings: dict):
+        self.timeout = setting(settings, 'STATE_TIMEOUT', DEFAULT_STATE_TIMEOUT)
+        self.claim_timeout = setting(settings, 'STATE_CLAIM_TIMEOUT', DEFAULT_STATE_CLAIM_TIMEOUT)
+
+    def save(self, state_token: str, data: dict):
+        """Store `data`, raise `CreateError` if `state_token` is already taken."""
+        raise NotImplementedError('Implement in subclass')
+
+    def pop(self, state_token: str) -> dict:
+        """Atomically fetch and remove the data, `None` if missing or already consumed."""
+        raise NotImplementedError('Implement in subclass')
+
+    def claim(self, state_token: str) -> dict:
+        """Atomically hold the data for the exchange of `state_token`, `None` if missing,
+        consumed or held by another exchange. To be followed by `delete` once the login
+        went through, by `release` otherwise so that a retry can claim it again."""
+        # stores without a claim of their own: taken out, put back on release
+        return self.pop(state_token)
+
+    def release(self, state_token: str, data: dict):
+        try:
+            self.save(state_token, data)
+        except CreateError:
+            pass
+
+    def delete(self, state_token: str):
+        pass
+
+    async def asave(self, state_token: str, data: dict):
+        await run_sync(self.save, state_token, data)
+
+    async def apop(self, state_token: str) -> dict:
+        return await run_sync(self.pop, state_token)
+
+    async def aclaim(self, state_token: str) -> dict:
+        return await run_sync(self.claim, state_token)
+
+    async def arelease(self, state_token: str, data: dict):
+        await run_sync(self.release, state_token, data)
+
+    async def adelete(self, state_token: str):
+        await run_sync(self.delete, state_token)
+
+
+class DBStateStore(BaseStateStore):
+    """Fallback store on `django_session` table.
+
+    Rows are keyed `sa_<state token>`, `purge_expired_states` finds the abandoned
+    ones by that prefix.
+    """
+
+    key_prefix = 'sa_'
+    # in the row data while an exchange holds the state, the time it frees it
+    claim_field = '_social_auth_claimed_until'
+
+    @classmethod
+    def session_key(cls, state_token: str) -> str:
+        key = cls.key_prefix + state_token
+        if len(key) > SESSION_KEY_MAX_LENGTH:
+            digest = hashlib.sha256(state_token.encode('utf-8')).hexdigest()
+            key = cls.key_prefix + digest[:SESSION_KEY_MAX_LENGTH - len(cls.key_prefix)]
+        return key
+
+    def save(self, state_token, data):
+        session = DBSessionStore()
+        session.update(data)
+        session.set_expiry(self.timeout)
+        # assigned after the data, or a lookup of the (missing) row would reset it
+        session._session_key = self.session_key(state_token)
+        session.save(must_create=True)
+
+    def pop(self, state_token):
+        data = self._pop(self.session_key(state_token))
+        if data is None and len(state_token) <= SESSION_KEY_MAX_LENGTH:
+            # saved before the key prefix, drop once those have expired
+            data = self._pop(state_token)
+        return data
+
+    def _session_keys(self, state_token):
+        keys = [self.session_key(state_token)]
+        if len(state_token) <= SESSION_KEY_MAX_LENGTH:
+            # saved before the key prefix
+            keys.append(state_token)
+        return keys
+
+    def claim(self, state_token):
+        for session_key in self._session_keys(state_token):
+            data = self._claim(session_key)
+            if data is not None:
+                return data
+        return None
+
+    def _claim(self, session_key):
+        model = DBSessionStore.get_model_class()
+        session_data = model.objects.filter(
+            session_key=session_key, expire_date__gt=timezone.now(),
+        ).values_list('session_data', flat=True).first()
+        if session_data is None:
+            return None
+        data = DBSessionStore().decode(session_data)
+        if data.get(self.claim_field, 0) > time.time():
+            return None
+        claimed = DBSessionStore().encode({**data, self.claim_field: time.time() + self.claim_timeout})
+        # compare-and-set of the row, only one of concurrent claims changes it
+        if not model.objects.filter(session_key=session_key, session_data=session_data).update(session_data=claimed):
+            return None
+        data.pop(self.claim_field, None)
+        data.pop('_session_expiry', None)
+        return data
+
+    def release(self, state_token, data):
+        model = DBSessionStore.get_model_class()
+        for session_key in self._session_keys(state_token):
+            session_data = model.objects.filter(session_key=session_key).values_list('session_data', flat=True).first()
+            if session_data is None:
+                continue
+            stored = DBSessionStore().decode(session_data)
+            if stored.pop(self.claim_field, None) is not None:
+                model.objects.filter(session_key=session_key, session_data=session_data).update(
+                    session_data=DBSessionStore().encode(stored),
+                )
+
+    def delete(self, state_token):
+        DBSessionStore.get_model_class().objects.filter(session_key__in=self._session_keys(state_token)).delete()
+
+    def _pop(self, session_key):
+        session = DBSessionStore(session_key=session_key)
+        data = session.load()
+        if not data:
+            return None
+        # only the caller that really deleted the row owns the state
+        deleted, _ = session.model.objects.filter(session_key=session_key).delete()
+        if not deleted:
+            return None
+        data.pop('_session_expiry', None)
+        return data
+
+
+def purge_expired_states(
+    batch_size: int = DEFAULT_PURGE_BATCH_SIZE,
+    sleep: float = DEFAULT_PURGE_SLEEP,
+    max_batches: int = None,
+    using: str = DEFAULT_DB_ALIAS,
+) -> int:
+    """Delete the expired rows of `DBStateStore`, return how many.
+
+    Walks the primary key of the `sa_` rows in batches (`LIKE 'sa\\_%'` and the keyset
+    stay on the key index), sleeping `sleep` seconds in between to go easy on the table.
+    Unlike `clearsessions`, other sessions are left alone.
+    """
+    model = DBSessionStore.get_model_class()
+    now = timezone.now()
+    candidates = model._default_manager.using(using).filter(
+        session_key__startswith=DBStateStore.key_prefix,
+        expire_date__lt=now,
+    ).order_by('session_key')
+
+    start = time.perf_counter()
+    purged = batches = 0
+    last_key = ''
+    while max_batches is None or batches < max_batches:
+        keys = list(candidates.filter(session_key__gt=last_key).values_list('session_key', flat=True)[:batch_size])
+        if not keys:
+            break
+        deleted, _ = model._default_manager.using(using).filter(session_key__in=keys).delete()
+        purged += deleted
+        batches += 1
+        last_key = keys[-1]
+        if len(keys) < batch_size:
+            break
+        if sleep:
+            time.sleep(sleep)
+
+    metrics.incr('state.purged', purged)
+    logger.info(
+        'social_auth expired states purged, rows: %s, batches: %s, elapsed: %.3f sec',
+        purged, batches, time.perf_counter() - start,
+    )
+    return purged
+
+
+class CacheStateStore(BaseStateStore):
+    """Store on a django cache (redis, memcached, locmem...).
+
+    Configured with `SOCIAL_AUTH_STATE_CACHE_ALIAS` (`default` if missing).
+    """
+
+    key_prefix = 'social_auth:state:'
+    claim_suffix = ':claim'
+
+    def __init__(self, settings: dict):
+        super().__init__(settings)
+        self.cache = caches[setting(settings, 'STATE_CACHE_ALIAS', DEFAULT_CACHE_ALIAS)]
+
+    def cache_key(self, state_token: str) -> str:
+        # the token comes from the client, hashed into a key memcached accepts as well
+        return self.key_prefix + hashlib.sha256(state_token.encode('utf-8')).hexdigest()
+
+    def save(self, state_token, data):
+        if not self.cache.add(self.cache_key(state_token), dict(data), self.timeout):
+            raise CreateError
+        logger.debug('social_auth state saved, state: %s', state_token)
+
+    def pop(self, state_token):
+        key = self.cache_key(state_token)
+        data = self.cache.get(key)
+        if data is None:
+            return None
+        # `delete` reports whether the key was there, concurrent pops only have one winner
+        return data if self.cache.delete(key) else None
+
+    def claim(self, state_token):
+        key = self.cache_key(state_token)
+        # `add` of the claim key, concurrent claims only have one winner
+        if not self.cache.add(key + self.claim_suffix, 1, self.claim_timeout):
+            return None
+        data = self.cache.get(key)
+        if data is None:
+            self.cache.delete(key + self.claim_suffix)
+        return data
+
+    def release(self, state_token, data):
+        self.cache.delete(self.cache_key(state_token) + self.claim_suffix)
+
+    def delete(self, state_token):
+        key = self.cache_key(state_token)
+        self.cache.delete_many([key, key + self.claim_suffix])
+
+    async def asave(self, state_token, data):
+        if not hasattr(self.cache, 'aadd'):
+            # django < 4.0
+            return await super().asave(state_token, data)
+        if not await self.cache.aadd(self.cache_key(state_token), dict(data), self.timeout):
+            raise CreateError
+        logger.debug('social_auth state saved, state: %s', state_token)
+
+    async def apop(self, state_token):
+        if not hasattr(self.cache, 'aget'):
+            return await super().apop(state_token)
+        key = self.cache_key(state_token)
+        data = await self.cache.aget(key)
+        if data is None:
+            return None
+        return data if await self.cache.adelete(key) else None
+
+    async def aclaim(self, state_token):
+        if not hasattr(self.cache, 'aadd'):
+            return await super().aclaim(state_token)
+        key = self.cache_key(state_token)
+        if not await self.cache.aadd(key + self.claim_suffix, 1, self.claim_timeout):
+            return None
+        data = await self.cache.aget(key)
+        if data is None:
+            await self.cache.adelete(key + self.claim_suffix)
+        return data
+
+    async def arelease(self, state_token, data):
+        if not hasattr(self.cache, 'adelete'):
+            return await super().arelease(state_token, data)
+        await self.cache.adelete(self.cache_key(state_token) + self.claim_suffix)
+
+    async def adelete(self, state_token):
+        if not hasattr(self.cache, 'adelete_many'):
+            return await super().adelete(state_token)
+        key = self.cache_key(state_token)
+        await self.cache.adelete_many([key, key + self.claim_suffix])
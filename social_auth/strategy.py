@@ -3,6 +3,9 @@ from django.utils.encoding import force_str
 from django.utils.functional import Promise
 from social_django.strategy import DjangoStrategy
 
+from .aio import run_sync
+
+
 class SaleorPluginStrategy(DjangoStrategy):
 
     def __init__(self, storage, settings, request_data, *args, **kwargs):
@@ -21,6 +24,13 @@ class SaleorPluginStrategy(DjangoStrategy):
             value = resolve_url(value)
         return value
 
+    def get_backend_class(self, name):
+        # prebuilt by `social_auth.registry.Registry.get_strategy`
+        registry = getattr(self, 'registry', None)
+        if registry is not None:
+            return registry.get_backend_class(name)
+        return super().get_backend_class(name)
+
     def request_data(self, merge=True):
         # graphql may not include query_string or data in request directly
         return self.req_data
@@ -31,4 +41,15 @@ class SaleorPluginStrategy(DjangoStrategy):
         kwargs['backend'] = backend
         # we need to assign request as `args` first element according to debug
         args = args + (kwargs.pop('request'), )
-        return backend.authenticate(*args, **kwargs)
\ No newline at end of file
+        return backend.authenticate(*args, **kwargs)
+
+
+class AsyncSaleorPluginStrategy(SaleorPluginStrategy):
+    """`SaleorPluginStrategy` for the async hooks (`SocialAuthPlugin.aexternal_*`).
+
+    The pipeline is plain ORM code, it runs in the thread pool while the event loop
+    keeps serving other logins.
+    """
+
+    async def aauthenticate(self, backend, *args, **kwargs):
+        return await run_sync(self.authenticate, backend, *args, **kwargs)
@@ -0,0 +1,90 @@
+import threading
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.db import DEFAULT_DB_ALIAS
+
+from .config import setting
+
+# user caches of this package are valid as long as the user generation is unchanged,
+# every save of the user (but a login bookkeeping one) starts a new generation
+GENERATION_KEY = 'social_auth:user_generation:{}'
+IGNORED_UPDATE_FIELDS = frozenset(('last_login', 'updated_at'))
+
+# caches of the user caches enabled in this process, the only ones a user change bumps
+_generation_aliases = set()
+_generation_aliases_lock = threading.Lock()
+
+
+def register_generation_alias(alias: str):
+    if alias not in _generation_aliases:
+        with _generation_aliases_lock:
+            _generation_aliases.add(alias)
+
+
+def register_generation_caches(settings: dict):
+    """Caches of the user caches enabled by the plugin settings, called by every plugin
+    instance so that a process saving users bumps them before serving a verify."""
+    for prefix in ('VERIFY_CACHE', 'REFRESH_CACHE'):
+        if setting(settings, f'{prefix}_TTL', 0):
+            register_generation_alias(setting(settings, f'{prefix}_ALIAS', DEFAULT_CACHE_ALIAS))
+    # `social_auth.pipeline.social_user`, global or per backend
+    if any(value for name, value in settings.items() if name.endswith('_SOCIAL_USER_CACHE_TTL')):
+        register_generation_alias(DEFAULT_CACHE_ALIAS)
+
+
+def generations_enabled() -> bool:
+    return bool(_generation_aliases)
+
+
+def _generation_cache(cache=None):
+    return caches[DEFAULT_CACHE_ALIAS] if cache is None else cache
+
+
+def get_generation(user_pk, cache=None):
+    """Generation of the user in `cache`, the one holding the entries it guards."""
+    return _generation_cache(cache).get(GENERATION_KEY.format(user_pk))
+
+
+def ensure_generation(user_pk, cache=None):
+    cache = _generation_cache(cache)
+    key = GENERATION_KEY.format(user_pk)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        generation = cache.get(key)
+    return generation
+
+
+def bump_generation(user_pk):
+    generation = uuid.uuid4().hex
+    for alias in list(_generation_aliases):
+        caches[alias].set(GENERATION_KEY.format(user_pk), generation, None)
+
+
+def snapshot_fields(names=None):
+    # the pk and `names`, every concrete field if `None`
+    fields = get_user_model()._meta.concrete_fields
+    if names is None:
+        return fields
+    return [field for field in fields if field.primary_key or field.name in names]
+
+
+def dump_user(user, names=None) -> dict:
+    # every concrete field by default, a deferred one would cost a query per field
+    # on access (`password` by the login, `username`... by the pipeline)
+    return {field.attname: getattr(user, field.attname) for field in snapshot_fields(names)}
+
+
+def load_user(snapshot: dict, names=None):
+    """The user of `dump_user(user, names)`, fields out of `names` deferred."""
+    fields = snapshot_fields(names)
+    if any(field.attname not in snapshot for field in fields):
+        # written before a field was added, treated as a miss
+        return None
+    return get_user_model().from_db(
+        DEFAULT_DB_ALIAS,
+        [field.attname for field in fields],
+        [snapshot[field.attname] for field in fields],
+    )
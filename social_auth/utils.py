@@ -1,18 +1,49 @@
 import logging
 from typing import Optional
-from urllib.parse import urlencode
+from urllib.parse import urlencode, urlparse
 
+from django.conf import settings
 from django.core.cache import cache
 from django.core.exceptions import ValidationError
+from django.http.request import split_domain_port
+from django.utils import timezone
 
-from social_core.utils import partial_pipeline_data, sanitize_redirect, user_is_active, user_is_authenticated
+from social_core.utils import partial_pipeline_data, user_is_active, user_is_authenticated
+from social_django.views import _do_login
 
+from saleor.account.error_codes import AccountErrorCode
 from saleor.core.utils import build_absolute_uri
-from saleor.core.utils.url import prepare_url, validate_storefront_url
+from saleor.core.utils.url import prepare_url
 from saleor.plugins.error_codes import PluginErrorCode
 
+from .aio import AsyncOAuth2Mixin, run_sync
+from .hosts import get_host_matcher, sanitize_redirect
+from .pipeline import write_behind_add, write_behind_enabled
+
 logger = logging.getLogger(__name__)
 
+NO_HOSTS = ()
+
+
+def validate_storefront_url(url: str):
+    # copy from saleor.core.utils.url.validate_storefront_url,
+    # ALLOWED_CLIENT_HOSTS compiled once instead of scanned on every call
+    try:
+        parsed_url = urlparse(url)
+        domain, _ = split_domain_port(parsed_url.netloc)
+        if not parsed_url.netloc:
+            raise ValidationError(
+                "Invalid URL. Please check if URL is in RFC 1808 format.",
+                code=AccountErrorCode.INVALID.value,
+            )
+    except ValueError as error:
+        raise ValidationError(error, code=AccountErrorCode.INVALID.value)
+    if not get_host_matcher(settings.ALLOWED_CLIENT_HOSTS).match_host(domain):
+        raise ValidationError(
+            f"{domain or url} is not allowed. Please check `ALLOWED_CLIENT_HOSTS` configuration.",
+            code=AccountErrorCode.INVALID.value,
+        )
+
 
 def validate_storefront_redirect_url(storefront_redirect_uri: Optional[str]):
     if not storefront_redirect_uri:
@@ -63,15 +94,26 @@ def do_auth(backend, redirect_name='next'):
         # Check and sanitize a user-defined GET/POST next field value
         redirect_uri = data[redirect_name]
         if backend.setting('SANITIZE_REDIRECTS', True):
-            allowed_hosts = backend.setting('ALLOWED_REDIRECT_HOSTS', []) + \
-                            [backend.strategy.request_host()]
-            redirect_uri = sanitize_redirect(allowed_hosts, redirect_uri)
+            # compiled once per configuration version, the request host is always allowed
+            allowed_hosts = get_host_matcher(backend.setting('ALLOWED_REDIRECT_HOSTS', NO_HOSTS))
+            redirect_uri = sanitize_redirect(allowed_hosts, backend.strategy.request_host(), redirect_uri)
         backend.strategy.session_set(
             redirect_name,
             redirect_uri or backend.setting('LOGIN_REDIRECT_URL')
         )
 
 
+def do_login(backend, user, social_user):
+    if not write_behind_enabled(backend):
+        return _do_login(backend, user, social_user)
+    # the session is thrown away right after under spa, only `last_login` matters,
+    # buffered instead of `django.contrib.auth.login` -> `update_last_login`.
+    # no `user_logged_in` then, its `update_last_login` receiver would write the row right away
+    user.backend = '{0}.{1}'.format(backend.__module__, backend.__class__.__name__)
+    user.last_login = timezone.now()
+    write_behind_add(backend, user, {'last_login': user.last_login})
+
+
 def do_complete(backend, login, user=None,
                 *args, **kwargs):
     is_authenticated = user_is_authenticated(user)
@@ -79,12 +121,20 @@ def do_complete(backend, login, user=None,
 
     partial = partial_pipeline_data(backend, user, *args, **kwargs)
     if partial:
-        user = backend.continue_pipeline(partial)
-        # clean partial data after usage
-        backend.strategy.clean_partial_pipeline(partial.token)
+        user = continue_partial(backend, partial)
     else:
         user = backend.complete(user=user, *args, **kwargs)
+    return finish_complete(backend, login, user)
+
+
+def continue_partial(backend, partial):
+    user = backend.continue_pipeline(partial)
+    # clean partial data after usage
+    backend.strategy.clean_partial_pipeline(partial.token)
+    return user
 
+
+def finish_complete(backend, login, user):
     # check if the output value is something else than a user and just
     # return it to the client
     user_model = backend.strategy.storage.user.user_model()
@@ -107,3 +157,20 @@ def do_complete(backend, login, user=None,
                 login(backend, user, social_user)
     return user
 
+
+async def ado_complete(backend, login, user=None, *args, **kwargs):
+    """`social_auth.utils.do_complete` awaiting the token exchange where the backend allows."""
+    if not isinstance(backend, AsyncOAuth2Mixin) or not backend.async_complete_supported():
+        return await run_sync(do_complete, backend, login, user, *args, **kwargs)
+
+    def resume(user):
+        user = user if user_is_authenticated(user) else None
+        partial = partial_pipeline_data(backend, user, *args, **kwargs)
+        if partial:
+            return continue_partial(backend, partial), True
+        return user, False
+
+    user, resumed = await run_sync(resume, user)
+    if not resumed:
+        user = await backend.aauth_complete(user=user, *args, **kwargs)
+    return await run_sync(finish_complete, backend, login, user)
@@ -0,0 +1,167 @@
+import base64
+import binascii
+import copy
+import hashlib
+import logging
+import time
+from typing import List
+
+from django.contrib.auth import get_user_model
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.exceptions import ValidationError
+
+from saleor.account.error_codes import AccountErrorCode
+from saleor.core.jwt import PERMISSIONS_FIELD
+from saleor.core.permissions import get_permissions_from_names
+from saleor.graphql.account.mutations.authentication import VerifyToken
+
+from .config import setting
+from .users import dump_user, ensure_generation, get_generation, load_user, register_generation_alias
+
+logger = logging.getLogger(__name__)
+
+# `QuerySet.update()` sends no signal, a user deactivated that way is seen at most that late
+MAX_CACHE_TTL = 300
+# what the hooks and saleor read of the verified user, the rest (password hash...)
+# stays out of the cache and is loaded on access
+SNAPSHOT_FIELDS = ('email', 'first_name', 'last_name', 'is_active', 'is_staff', 'jwt_token_key')
+
+
+def token_hash(token: str) -> str:
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def payload_user_pk(payload: dict):
+    # `user_id` is the global id of the user, base64 of `User:<pk>`
+    try:
+        type_name, pk = base64.b64decode(payload['user_id']).decode('utf-8').split(':', 1)
+    except (KeyError, TypeError, ValueError, binascii.Error):
+        return None
+    return pk if type_name == 'User' else None
+
+
+def apply_payload_permissions(user, payload: dict):
+    # copy from saleor.core.jwt.get_user
+    permissions = payload.get(PERMISSIONS_FIELD, None)
+    if permissions is not None:
+        user.effective_permissions = get_permissions_from_names(permissions)
+    return user
+
+
+class VerifyCache:
+    """Verified access tokens, payload and user snapshot (`SNAPSHOT_FIELDS`) keyed by the token hash.
+
+    Entries live until the token `exp`, at most `SOCIAL_AUTH_VERIFY_CACHE_TTL` seconds
+    (0, the default, disables the cache, capped by `MAX_CACHE_TTL`) and are dropped with
+    the user generation, kept in the same cache (`SOCIAL_AUTH_VERIFY_CACHE_ALIAS`), which
+    must be shared by all workers so that deactivations are seen everywhere.
+    """
+
+    key_prefix = 'social_auth:verify:'
+    setting_prefix = 'VERIFY_CACHE'
+
+    def __init__(self, settings: dict):
+        self.max_ttl = min(setting(settings, f'{self.setting_prefix}_TTL', 0), MAX_CACHE_TTL)
+        alias = setting(settings, f'{self.setting_prefix}_ALIAS', DEFAULT_CACHE_ALIAS)
+        self.cache = caches[alias]
+        if self.max_ttl:
+            register_generation_alias(alias)
+
+    @property
+    def enabled(self):
+        return bool(self.max_ttl)
+
+    def get(self, token: str):
+        if not token:
+            return None
+        entry = self.cache.get(self.key_prefix + token_hash(token))
+        if entry is None:
+            return None
+        snapshot, payload, generation = entry
+        # the cache may keep it up to a second longer
+        if generation != get_generation(payload_user_pk(payload), self.cache) or payload.get('exp', 0) <= time.time():
+            return None
+        user = load_user(snapshot, SNAPSHOT_FIELDS)
+        if user is None:
+            return None
+        return apply_payload_permissions(user, payload), payload
+
+    def generation(self, payload: dict):
+        """Generation of the token user, to read before the user itself: a change
+        committed in between then makes the entry stale instead of cached."""
+        pk = payload_user_pk(payload)
+        if pk is None:
+            return None
+        return ensure_generation(pk, self.cache)
+
+    def set(self, token: str, user, payload: dict, generation):
+        if generation is None or str(user.pk) != payload_user_pk(payload):
+            return
+        ttl = min(int(payload.get('exp', 0) - time.time()), self.max_ttl)
+        if ttl <= 0:
+            return
+        self.cache.set(self.key_prefix + token_hash(token), (dump_user(user, SNAPSHOT_FIELDS), payload, generation), ttl)
+
+
+class RefreshCache(VerifyCache):
+    """Checked refresh tokens, same entries as `VerifyCache`: a refresh of a cached token
+    neither decodes it nor queries its user, while a deactivation or a password change
+    (new `jwt_token_key`) still invalidates it through the user generation.
+
+    `SOCIAL_AUTH_REFRESH_CACHE_TTL` (0, the default, disables the cache, capped by
+    `MAX_CACHE_TTL`), `SOCIAL_AUTH_REFRESH_CACHE_ALIAS`, holding the generations too.
+    """
+
+    key_prefix = 'social_auth:refresh:'
+    setting_prefix = 'REFRESH_CACHE'
+
+
+def invalid_token_error():
+    # copy from saleor.graphql.account.mutations.authentication.VerifyToken.get_user
+    return ValidationError(
+        {"token": ValidationError("Invalid token", code=AccountErrorCode.INVALID.value)}
+    )
+
+
+def verify_tokens(tokens: List[str], verify_cache: VerifyCache = None) -> list:
+    """Verify access tokens at once, `[(user, payload, error), ...]` in order of `tokens`.
+
+    Same checks as `VerifyToken.get_payload` and `VerifyToken.get_user`, but the users
+    of all the tokens are fetched with a single query.
+    """
+    results = [None] * len(tokens)
+    pending = []
+    for index, token in enumerate(tokens):
+        if verify_cache is not None and verify_cache.enabled:
+            cached = verify_cache.get(token)
+            if cached is not None:
+                results[index] = cached + (None,)
+                continue
+        try:
+            payload = VerifyToken.get_payload(token)
+        except ValidationError as error:
+            results[index] = (None, None, error)
+            continue
+        generation = verify_cache.generation(payload) if verify_cache is not None and verify_cache.enabled else None
+        pending.append((index, token, payload, generation))
+
+    emails = {payload.get('email') for _, _, payload, _ in pending if payload.get('email')}
+    users = {}
+    if emails:
+        users = {
+            user.email: user
+            for user in get_user_model()._default_manager.filter(email__in=emails, is_active=True)
+        }
+
+    for index, token, payload, generation in pending:
+        user = users.get(payload.get('email'))
+        jwt_token = payload.get('token')
+        if user is None or not jwt_token or user.jwt_token_key != jwt_token:
+            results[index] = (None, payload, invalid_token_error())
+            continue
+        # tokens of the same user may carry different permissions
+        user = apply_payload_permissions(copy.copy(user), payload)
+        if verify_cache is not None and verify_cache.enabled:
+            verify_cache.set(token, user, payload, generation)
+        results[index] = (user, payload, None)
+    return results
@@ -0,0 +1,79 @@
+import atexit
+import logging
+import threading
+from collections import defaultdict
+
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = 1.0
+DEFAULT_MAX_SIZE = 500
+
+
+class WriteBehindBuffer:
+    """Coalesce field updates of model rows and persist them later with `bulk_update`.
+
+    Updates of the same row are merged, the last value of a field wins. The buffer is
+    flushed `interval` seconds after the first pending update, once `max_size` rows are
+    pending or at process exit. Model signals are not sent for buffered writes.
+    """
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def add(self, instance, values: dict, interval=DEFAULT_INTERVAL, max_size=DEFAULT_MAX_SIZE):
+        key = (type(instance), instance.pk)
+        with self._lock:
+            self._pending.setdefault(key, {}).update(values)
+            size = len(self._pending)
+            if size < max_size and self._timer is None:
+                self._timer = threading.Timer(interval, self._flush_in_background)
+                self._timer.daemon = True
+                self._timer.start()
+        if size >= max_size:
+            self.flush()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def flush(self) -> int:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not pending:
+            return 0
+
+        # bulk_update needs the same fields on every object of a batch
+        batches = defaultdict(list)
+        for (model, pk), values in pending.items():
+            instance = model(pk=pk)
+            for name, value in values.items():
+                setattr(instance, name, value)
+            batches[(model, tuple(sorted(values)))].append(instance)
+
+        for (model, fields), instances in batches.items():
+            try:
+                model._default_manager.bulk_update(instances, fields)
+            except Exception:
+                logger.exception(
+                    'social_auth write behind flush failed, model: %s, fields: %s, rows: %s',
+                    model.__name__, fields, len(instances),
+                )
+        logger.debug('social_auth write behind flushed, rows: %s', len(pending))
+        return len(pending)
+
+    def _flush_in_background(self):
+        try:
+            self.flush()
+        finally:
+            # timer thread owns its db connection
+            connections.close_all()
+
+
+write_behind = WriteBehindBuffer()
+atexit.register(write_behind.flush)
@@ -0,0 +1,112 @@
+import threading
+from http.server import ThreadingHTTPServer
+
+import django
+import pytest
+from django.conf import settings
+
+
+def pytest_configure(config):
+    # the plugin runs inside saleor, these tests only need `saleor` importable
+    settings.configure(
+        SECRET_KEY='social-auth-tests',
+        USE_TZ=True,
+        INSTALLED_APPS=[
+            'django.contrib.auth',
+            'django.contrib.contenttypes',
+            'django.contrib.sessions',
+            'social_django',
+        ],
+        DATABASES={'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}},
+        CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+        # `*_URL` settings go through `resolve_url`
+        ROOT_URLCONF='social_django.urls',
+    )
+    django.setup()
+
+
+@pytest.fixture(scope='session')
+def migrated_db():
+    from django.core.management import call_command
+
+    call_command('migrate', verbosity=0)
+
+
+@pytest.fixture
+def cache():
+    from django.core.cache import cache
+
+    cache.clear()
+    yield cache
+    cache.clear()
+
+
+class CountingHTTPServer(ThreadingHTTPServer):
+    """Stub provider counting the connections it accepted."""
+
+    daemon_threads = True
+    accepted = 0
+
+    def get_request(self):
+        request = super().get_request()
+        self.accepted += 1
+        return request
+
+    @property
+    def base_url(self):
+        return 'http://{}:{}'.format(*self.server_address)
+
+
+@pytest.fixture
+def stub_server():
+    """`stub_server(handler_class)` serves on a free local port until the test ends."""
+    from social_auth.http_pool import close_sessions
+
+    servers = []
+
+    def start(handler_class):
+        server = CountingHTTPServer(('127.0.0.1', 0), handler_class)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    # pooled connections to a server about to go away
+    close_sessions()
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def make_backend():
+    """`make_backend(backend_class, data=None, **settings)` on the plugin strategy,
+    `data` being the request data of the hook."""
+    from social_django.models import DjangoStorage
+
+    from social_auth.strategy import SaleorPluginStrategy
+
+    def make(backend_class, data=None, **settings):
+        return backend_class(SaleorPluginStrategy(DjangoStorage, settings, data or {}))
+
+    return make
+
+
+@pytest.fixture
+def generation_aliases(monkeypatch):
+    """The caches of user generations registered by the test only, with the user model signals."""
+    import social_auth.signals  # noqa: F401
+    from social_auth import users
+
+    aliases = set()
+    monkeypatch.setattr(users, '_generation_aliases', aliases)
+    return aliases
+
+
+@pytest.fixture
+def user(migrated_db, cache, generation_aliases):
+    from django.contrib.auth import get_user_model
+
+    user = get_user_model().objects.create(username='user1', email='user1@example.com', password='hash')
+    yield user
+    get_user_model().objects.all().delete()
@@ -0,0 +1,135 @@
+import base64
+import json
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import parse_qs
+
+import pytest
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+from social_core.exceptions import AuthFailed
+
+from social_auth.backends.alipay import AlipayAuth, load_key, sign_content
+
+TOKEN_NODE = 'alipay_system_oauth_token_response'
+
+
+def generate_key_pair():
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_pem = private_key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption(),
+    ).decode('ascii')
+    public_pem = private_key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo,
+    ).decode('ascii')
+    return private_key, private_pem, public_pem
+
+
+APP_KEY, APP_PRIVATE_PEM, APP_PUBLIC_PEM = generate_key_pair()
+GATEWAY_KEY, _, GATEWAY_PUBLIC_PEM = generate_key_pair()
+
+
+def sign(private_key, content: str) -> str:
+    return base64.b64encode(private_key.sign(content.encode('utf-8'), padding.PKCS1v15(), hashes.SHA256())).decode('ascii')
+
+
+class GatewayHandler(BaseHTTPRequestHandler):
+    """alipay.system.oauth.token of the gateway, the answer depends on the auth code:
+    `ok` signed success, `invalid` unsigned error, `tampered` success altered after signing."""
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    received = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        params = {key: values[0] for key, values in parse_qs(self.rfile.read(length).decode('utf-8')).items()}
+        try:
+            APP_KEY.public_key().verify(
+                base64.b64decode(params['sign']), sign_content(params).encode('utf-8'),
+                padding.PKCS1v15(), hashes.SHA256(),
+            )
+            params['sign_valid'] = True
+        except InvalidSignature:
+            params['sign_valid'] = False
+        self.received.append(params)
+
+        code = params.get('code')
+        if code == 'invalid':
+            error = {'code': '40002', 'msg': 'Invalid Arguments', 'sub_code': 'isv.code-invalid', 'sub_msg': 'bad code'}
+            text = json.dumps({'error_response': error})
+        else:
+            node = json.dumps({
+                'code': '10000', 'msg': 'Success', 'user_id': '2088000000000001',
+                'access_token': 'token-' + code, 'expires_in': 1296000,
+                'refresh_token': 'refresh-' + code, 're_expires_in': 2592000,
+            })
+            signature = sign(GATEWAY_KEY, node)
+            if code == 'tampered':
+                node = node.replace('2088000000000001', '2088000000000002')
+            text = f'{{"{TOKEN_NODE}": {node}, "sign": "{signature}"}}'
+
+        content = text.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html;charset=utf-8')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+
+@pytest.fixture
+def gateway(stub_server):
+    GatewayHandler.received = []
+    return stub_server(GatewayHandler)
+
+
+@pytest.fixture
+def exchange(gateway, make_backend):
+    def exchange(code):
+        backend = make_backend(
+            AlipayAuth,
+            data={'auth_code': code},
+            SOCIAL_AUTH_ALIPAY_KEY='2021000000000000',
+            SOCIAL_AUTH_ALIPAY_SECRET=APP_PRIVATE_PEM,
+            SOCIAL_AUTH_ALIPAY_PUBLIC_KEY=GATEWAY_PUBLIC_PEM,
+            SOCIAL_AUTH_ALIPAY_GATEWAY_URL=gateway.base_url + '/gateway.do',
+        )
+        return backend.request_access_token(
+            backend.access_token_url(), method='POST', data=backend.auth_complete_params(),
+        )
+
+    return exchange
+
+
+def test_signed_success(exchange):
+    response = exchange('ok')
+
+    assert response['access_token'] == 'token-ok'
+    assert response['user_id'] == '2088000000000001'
+    assert response['error'] is None
+    request, = GatewayHandler.received
+    assert request['sign_valid']
+    assert request['method'] == 'alipay.system.oauth.token'
+    assert request['grant_type'] == 'authorization_code'
+
+
+def test_unsigned_error_response(exchange):
+    response = exchange('invalid')
+
+    assert response['access_token'] is None
+    assert response['error'] == 'isv.code-invalid'
+    assert response['error_description'] == 'bad code'
+
+
+def test_tampered_signature(exchange):
+    with pytest.raises(AuthFailed, match='Invalid alipay response signature'):
+        exchange('tampered')
+
+
+def test_bare_base64_keys():
+    body = ''.join(line for line in GATEWAY_PUBLIC_PEM.splitlines() if not line.startswith('-----'))
+
+    assert load_key(body).public_numbers() == load_key(GATEWAY_PUBLIC_PEM).public_numbers()
@@ -0,0 +1,126 @@
+import types
+
+import pytest
+
+from social_auth import breaker as breaker_module
+from social_auth.backends.weapp import WeappAuth
+from social_auth.breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError, get_breaker
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(breaker_module, 'time', types.SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+
+@pytest.fixture
+def breaker(clock):
+    return CircuitBreaker(
+        'weixin-weapp', window=10, min_calls=4, error_rate=0.5, slow_rate=0.5,
+        latency_budget=1.0, open_timeout=30, half_open_calls=2,
+    )
+
+
+def calls(breaker, count, duration=0.1, failed=False):
+    for _ in range(count):
+        breaker.before_call(WeappAuth)
+        breaker.record(duration, failed)
+
+
+def test_closed_below_min_calls(breaker):
+    calls(breaker, 3, failed=True)
+
+    assert breaker.state == CLOSED
+
+
+def test_opens_on_errors(breaker):
+    calls(breaker, 2)
+    calls(breaker, 2, failed=True)
+
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError, match='try again in 30 seconds'):
+        breaker.before_call(WeappAuth)
+
+
+def test_opens_on_slow_calls(breaker):
+    calls(breaker, 2)
+    calls(breaker, 2, duration=1.5)
+
+    assert breaker.state == OPEN
+
+
+def test_calls_out_of_the_window_do_not_count(breaker, clock):
+    calls(breaker, 3, failed=True)
+    clock.now += 11
+    calls(breaker, 3)
+
+    assert breaker.state == CLOSED
+
+
+def test_half_open_after_the_timeout(breaker, clock):
+    calls(breaker, 4, failed=True)
+    clock.now += 31
+
+    breaker.before_call(WeappAuth)
+
+    assert breaker.state == HALF_OPEN
+
+
+def test_half_open_lets_the_probes_through_only(breaker, clock):
+    calls(breaker, 4, failed=True)
+    clock.now += 31
+    breaker.before_call(WeappAuth)
+    breaker.before_call(WeappAuth)
+
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call(WeappAuth)
+
+
+def test_successful_probes_close(breaker, clock):
+    calls(breaker, 4, failed=True)
+    clock.now += 31
+
+    calls(breaker, 2)
+
+    assert breaker.state == CLOSED
+    # a fresh window, the errors before are forgotten
+    calls(breaker, 1, failed=True)
+    assert breaker.state == CLOSED
+
+
+@pytest.mark.parametrize('duration, failed', [(0.1, True), (1.5, False)])
+def test_failed_or_slow_probe_opens_again(breaker, clock, duration, failed):
+    calls(breaker, 4, failed=True)
+    clock.now += 31
+
+    calls(breaker, 1, duration=duration, failed=failed)
+
+    assert breaker.state == OPEN
+    assert breaker.opened_at == clock.now
+
+
+def test_calls_let_through_before_opening_are_ignored(breaker):
+    for _ in range(5):
+        breaker.before_call(WeappAuth)
+    for _ in range(4):
+        breaker.record(0.1, True)
+
+    breaker.record(0.1, False)
+
+    assert breaker.state == OPEN
+
+
+def test_breaker_per_backend_and_settings():
+    assert get_breaker('weixin-weapp', window=10) is get_breaker('weixin-weapp', window=10)
+    assert get_breaker('weixin-weapp', window=10) is not get_breaker('weixin-weapp', window=20)
+    assert get_breaker('weixin-weapp', window=10) is not get_breaker('alipay', window=10)
@@ -0,0 +1,81 @@
+import pytest
+from django.http.request import validate_host
+
+from social_auth.hosts import HostMatcher, get_host_matcher, sanitize_redirect
+
+PATTERNS = ['example.com', '.shop.example', '*.cdn.example', 'localhost:3000']
+
+
+@pytest.mark.parametrize('host, allowed', [
+    ('example.com', True),
+    ('www.example.com', False),
+    ('shop.example', True),
+    ('eu.shop.example', True),
+    ('a.b.shop.example', True),
+    ('cdn.example', False),
+    ('img.cdn.example', True),
+    ('notshop.example', False),
+    ('example.com.evil.test', False),
+    ('localhost', False),
+    ('', False),
+])
+def test_match_host(host, allowed):
+    assert HostMatcher(PATTERNS).match_host(host) is allowed
+
+
+@pytest.mark.parametrize('netloc, allowed', [
+    ('localhost:3000', True),
+    ('LOCALHOST:3000', True),
+    ('localhost:8000', False),
+    ('example.com', True),
+    ('example.com:8443', False),
+    ('eu.shop.example', True),
+])
+def test_match_netloc(netloc, allowed):
+    assert HostMatcher(PATTERNS).match_netloc(netloc) is allowed
+
+
+@pytest.mark.parametrize('host', [
+    'example.com', 'www.example.com', 'shop.example', 'eu.shop.example', 'other.test', 'com', '',
+])
+def test_same_as_django_allowed_hosts(host):
+    patterns = ['example.com', '.shop.example']
+
+    assert HostMatcher(patterns).match_host(host) is validate_host(host, patterns)
+
+
+def test_wildcard():
+    matcher = HostMatcher(['*'])
+
+    assert matcher.match_host('anything.test')
+    assert matcher.match_netloc('anything.test:8000')
+
+
+@pytest.mark.parametrize('pattern', ['', '.', '*.', 'a..b', '*.example.com:3000'])
+def test_invalid_patterns_are_ignored(pattern):
+    matcher = HostMatcher([pattern])
+
+    assert not matcher.match_host('example.com')
+    assert not matcher.match_netloc('example.com:3000')
+
+
+def test_matcher_compiled_once_per_list():
+    patterns = list(PATTERNS)
+
+    assert get_host_matcher(patterns) is get_host_matcher(patterns)
+    assert get_host_matcher(list(PATTERNS)) is not get_host_matcher(patterns)
+
+
+@pytest.mark.parametrize('redirect_to, expected', [
+    ('/account', '/account'),
+    ('https://api.example/callback', 'https://api.example/callback'),
+    ('https://eu.shop.example/account', 'https://eu.shop.example/account'),
+    ('http://localhost:3000/', 'http://localhost:3000/'),
+    ('https://evil.test/', None),
+    ('///evil.test', None),
+    ('', None),
+    (None, None),
+    (['https://example.com'], None),
+])
+def test_sanitize_redirect(redirect_to, expected):
+    assert sanitize_redirect(HostMatcher(PATTERNS), 'api.example', redirect_to) == expected
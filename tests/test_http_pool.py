@@ -0,0 +1,85 @@
+import json
+import time
+from http.server import BaseHTTPRequestHandler
+
+import pytest
+from social_core.exceptions import AuthFailed
+
+from social_auth.backends.weapp import WeappAuth
+from social_auth.http_pool import get_session
+
+
+class JSONHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        content = json.dumps({'path': self.path, 'cookie': self.headers.get('Cookie')}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.send_header('Set-Cookie', 'provider=session-of-another-user; Path=/')
+        self.end_headers()
+        self.wfile.write(content)
+
+
+def test_requests_reuse_the_connection(stub_server, make_backend):
+    server = stub_server(JSONHandler)
+    backend = make_backend(WeappAuth)
+
+    first = backend.request(server.base_url + '/sns/jscode2session?js_code=a')
+    second = backend.request(server.base_url + '/sns/jscode2session?js_code=b')
+
+    assert first.json()['path'].endswith('js_code=a')
+    assert second.json()['path'].endswith('js_code=b')
+    assert server.accepted == 1
+
+
+def test_backends_share_the_pool(stub_server, make_backend):
+    server = stub_server(JSONHandler)
+
+    make_backend(WeappAuth).request(server.base_url + '/')
+    make_backend(WeappAuth).request(server.base_url + '/')
+
+    assert server.accepted == 1
+
+
+def test_provider_cookies_are_not_kept(stub_server, make_backend):
+    server = stub_server(JSONHandler)
+    backend = make_backend(WeappAuth)
+
+    backend.request(server.base_url + '/')
+
+    assert backend.request(server.base_url + '/').json()['cookie'] is None
+
+
+def test_pool_per_setup():
+    assert get_session(4, 0) is get_session(4, 0)
+    assert get_session(4, 0) is not get_session(4, 1)
+
+
+class SlowHandler(JSONHandler):
+
+    def do_GET(self):
+        time.sleep(1)
+        super().do_GET()
+
+
+def test_timeouts_capped_by_the_latency_budget(stub_server, make_backend):
+    server = stub_server(SlowHandler)
+    backend = make_backend(WeappAuth, SOCIAL_AUTH_CIRCUIT_LATENCY_BUDGET=0.2)
+
+    assert backend.http_timeout() == (0.2, 0.2)
+    start = time.perf_counter()
+    with pytest.raises(AuthFailed):
+        backend.request(server.base_url + '/')
+    assert time.perf_counter() - start < 0.9
+
+
+def test_timeouts_without_circuit_breaker(make_backend):
+    backend = make_backend(WeappAuth, SOCIAL_AUTH_CIRCUIT_BREAKER=False, SOCIAL_AUTH_HTTP_READ_TIMEOUT=30)
+
+    assert backend.http_timeout() == (3.05, 30)
@@ -0,0 +1,36 @@
+from social_auth.lru import BoundedLRU
+
+
+def test_least_recently_used_dropped():
+    cache = BoundedLRU(2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+
+    # read, `b` is the least recently used now
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    assert len(cache) == 2
+
+
+def test_set_refreshes_the_entry():
+    cache = BoundedLRU(2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.set('a', 10)
+    cache.set('c', 3)
+
+    assert cache.get('a') == 10
+    assert cache.get('b', 'missing') == 'missing'
+
+
+def test_clear():
+    cache = BoundedLRU(2)
+    cache.set('a', 1)
+    cache.clear()
+
+    assert cache.get('a') is None
+    assert len(cache) == 0
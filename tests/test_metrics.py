@@ -0,0 +1,51 @@
+import pytest
+
+from social_auth import metrics
+from social_auth.metrics import MemorySink, StatsdSink
+
+STATSD = {'SOCIAL_AUTH_METRICS_SINK': 'social_auth.metrics.StatsdSink'}
+
+
+@pytest.fixture(autouse=True)
+def process_sink(monkeypatch):
+    monkeypatch.setattr(metrics, '_sink', None)
+    monkeypatch.setattr(metrics, '_configured_sink', None)
+    monkeypatch.setattr(metrics, '_configured_version', None)
+    yield
+    if metrics._configured_sink is not None:
+        metrics._configured_sink.close()
+
+
+def test_sink_once_per_version():
+    metrics.configure('v1', STATSD)
+    sink = metrics.get_sink()
+    metrics.configure('v1', STATSD)
+
+    assert isinstance(sink, StatsdSink)
+    assert metrics.get_sink() is sink
+
+
+def test_previous_sink_is_closed():
+    metrics.configure('v1', STATSD)
+    previous = metrics.get_sink()
+
+    metrics.configure('v2', {})
+
+    assert previous.socket.fileno() == -1
+    assert metrics.get_sink() is None
+    # a span started before the switch still ends fine
+    previous.incr('social_auth.login')
+
+
+def test_sink_of_set_sink_is_left_open():
+    metrics.configure('v1', STATSD)
+    configured = metrics.get_sink()
+    sink = StatsdSink()
+    metrics.set_sink(sink)
+
+    metrics.configure('v2', {'SOCIAL_AUTH_METRICS_SINK': 'social_auth.metrics.MemorySink'})
+
+    assert configured.socket.fileno() == -1
+    assert sink.socket.fileno() != -1
+    assert isinstance(metrics.get_sink(), MemorySink)
+    sink.close()
@@ -0,0 +1,91 @@
+import threading
+import time
+
+import pytest
+
+from social_auth.oidc import DocumentCache
+
+
+class Response:
+
+    def __init__(self, document, cache_control='max-age=3600'):
+        self.document = document
+        self.headers = {'Cache-Control': cache_control}
+
+    def json(self):
+        return self.document
+
+
+class Provider:
+    """`fetch` of a document, counting the calls, failing while `down`."""
+
+    def __init__(self, document=None, delay=0):
+        self.document = document or {'keys': []}
+        self.delay = delay
+        self.down = False
+        self.calls = 0
+
+    def fetch(self):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.down:
+            raise ConnectionError('provider down')
+        return Response(self.document)
+
+
+def test_documents_are_cached():
+    cache = DocumentCache()
+    provider = Provider({'keys': [{'kid': 'a'}]})
+
+    assert cache.get('https://idp/jwks', provider.fetch) == {'keys': [{'kid': 'a'}]}
+    assert cache.get('https://idp/jwks', provider.fetch) == {'keys': [{'kid': 'a'}]}
+    assert provider.calls == 1
+
+
+def test_force_refresh_once_per_interval():
+    cache = DocumentCache()
+    provider = Provider()
+    cache.get('https://idp/jwks', provider.fetch)
+
+    cache.force_refresh('https://idp/jwks', provider.fetch, min_interval=0)
+    cache.force_refresh('https://idp/jwks', provider.fetch, min_interval=60)
+
+    assert provider.calls == 2
+
+
+def test_force_refresh_rate_limited_while_the_provider_is_down():
+    cache = DocumentCache()
+    provider = Provider({'keys': [{'kid': 'a'}]})
+    cache.get('https://idp/jwks', provider.fetch)
+    provider.down = True
+
+    # failed, the previous document is kept
+    assert cache.force_refresh('https://idp/jwks', provider.fetch, min_interval=0) == {'keys': [{'kid': 'a'}]}
+    for _ in range(10):
+        cache.force_refresh('https://idp/jwks', provider.fetch, min_interval=60)
+
+    assert provider.calls == 2
+
+
+def test_first_fetch_failure_raises():
+    provider = Provider()
+    provider.down = True
+
+    with pytest.raises(ConnectionError):
+        DocumentCache().get('https://idp/jwks', provider.fetch)
+
+
+def test_slow_provider_does_not_block_other_urls():
+    cache = DocumentCache()
+    slow = Provider(delay=1)
+    fast = Provider()
+    thread = threading.Thread(target=cache.get, args=('https://slow/jwks', slow.fetch))
+    thread.start()
+    time.sleep(0.1)
+
+    start = time.perf_counter()
+    cache.get('https://fast/jwks', fast.fetch)
+    elapsed = time.perf_counter() - start
+    thread.join()
+
+    assert elapsed < 0.5
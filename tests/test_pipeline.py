@@ -0,0 +1,100 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from social_core.exceptions import AuthAlreadyAssociated
+
+from social_auth import pipeline
+from social_auth.backends.weapp import WeappAuth
+from social_auth.pipeline import get_cached_social, social_user
+
+
+@pytest.fixture
+def social(user):
+    from social_django.models import UserSocialAuth
+
+    return UserSocialAuth.objects.create(user=user, provider='weixin-weapp', uid='openid1', extra_data={})
+
+
+@pytest.fixture
+def backend(make_backend):
+    return make_backend(WeappAuth, SOCIAL_AUTH_SOCIAL_USER_CACHE_TTL=60)
+
+
+def cached(backend, uid='openid1'):
+    return get_cached_social(backend.strategy.storage.user, backend.name, uid)
+
+
+def test_cached_social_user(backend, social, user):
+    social_user(backend, 'openid1')
+
+    with CaptureQueriesContext(connection) as queries:
+        result = social_user(backend, 'openid1')
+
+    assert len(queries) == 0
+    assert (result['social'].pk, result['user'].pk) == (social.pk, user.pk)
+    assert result['is_new'] is False
+
+
+def test_unknown_uid_is_not_cached(backend, user):
+    assert social_user(backend, 'openid2')['social'] is None
+    assert cached(backend, 'openid2') is None
+
+
+def test_user_change_invalidates(backend, social, user):
+    social_user(backend, 'openid1')
+
+    user.first_name = 'Changed'
+    user.save()
+
+    assert cached(backend) is None
+    assert social_user(backend, 'openid1')['user'].first_name == 'Changed'
+
+
+def test_change_while_loading_the_user(backend, social, user, monkeypatch):
+    load = pipeline.social_core_social_user
+
+    def load_then_change(*args, **kwargs):
+        result = load(*args, **kwargs)
+        # committed by another request after the user was read
+        user.save()
+        return result
+
+    monkeypatch.setattr(pipeline, 'social_core_social_user', load_then_change)
+    social_user(backend, 'openid1')
+
+    assert cached(backend) is None
+
+
+def test_social_deletion_invalidates(backend, social):
+    social_user(backend, 'openid1')
+
+    social.delete()
+
+    assert cached(backend) is None
+
+
+def test_social_save_writes_through(backend, social):
+    social_user(backend, 'openid1')
+
+    social.extra_data = {'unionid': 'union1'}
+    social.save()
+
+    assert cached(backend).extra_data == {'unionid': 'union1'}
+
+
+def test_other_user_is_already_associated(backend, social):
+    from django.contrib.auth import get_user_model
+
+    social_user(backend, 'openid1')
+    other = get_user_model().objects.create(username='user2', email='user2@example.com')
+
+    with pytest.raises(AuthAlreadyAssociated):
+        social_user(backend, 'openid1', user=other)
+
+
+def test_disabled_by_default(make_backend, social, generation_aliases):
+    backend = make_backend(WeappAuth, SOCIAL_AUTH_SOCIAL_USER_CACHE_TTL=0)
+
+    assert social_user(backend, 'openid1')['social'].pk == social.pk
+    assert cached(backend) is None
+    assert not generation_aliases
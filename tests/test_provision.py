@@ -0,0 +1,113 @@
+import json
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.db.models.query import QuerySet
+
+from social_auth.backends.weapp import WeappAuth
+from social_auth.provision import import_accounts, import_file, read_records
+
+
+@pytest.fixture
+def backend(migrated_db, make_backend):
+    yield make_backend(WeappAuth)
+    get_user_model().objects.all().delete()
+
+
+def socials():
+    from social_django.models import UserSocialAuth
+
+    return UserSocialAuth.objects.filter(provider='weixin-weapp')
+
+
+def records(*openids):
+    return [{'openid': openid, 'unionid': f'union-{openid}'} for openid in openids]
+
+
+def write_jsonl(path, rows):
+    path.write_text(''.join(json.dumps(row) + '\n' for row in rows), encoding='utf-8')
+    return str(path)
+
+
+def test_import(backend):
+    counts = import_accounts(backend, records('openid1', 'openid2'))
+
+    assert counts == {'records': 2, 'users': 2, 'accounts': 2, 'existing': 0, 'skipped': 0}
+    social = socials().get(uid='openid1@qq.com')
+    assert social.user.username == 'openid1'
+    assert not social.user.has_usable_password()
+    assert social.extra_data['unionid'] == 'union-openid1'
+
+
+def test_import_again(backend):
+    import_accounts(backend, records('openid1', 'openid2'))
+
+    counts = import_accounts(backend, records('openid1', 'openid2', 'openid3'))
+
+    assert counts == {'records': 3, 'users': 1, 'accounts': 1, 'existing': 2, 'skipped': 0}
+    assert socials().count() == 3
+
+
+def test_existing_user_is_matched(backend):
+    user = get_user_model().objects.create(username='openid1', email='openid1@example.com')
+
+    counts = import_accounts(backend, records('openid1'))
+
+    assert (counts['users'], counts['accounts']) == (0, 1)
+    assert socials().get().user == user
+
+
+def test_unusable_and_repeated_records_are_skipped(backend):
+    counts = import_accounts(backend, [{'unionid': 'no-openid'}] + records('openid1', 'openid1'))
+
+    assert counts == {'records': 3, 'users': 1, 'accounts': 1, 'existing': 0, 'skipped': 2}
+
+
+def test_association_of_a_concurrent_login(backend, monkeypatch):
+    bulk_create = QuerySet.bulk_create
+
+    def login_first(queryset, objs, *args, **kwargs):
+        if queryset.model is socials().model:
+            # committed between the read of the known uids and the insert
+            other = get_user_model().objects.create(username='other', email='other@example.com')
+            socials().create(user=other, provider='weixin-weapp', uid='openid1@qq.com', extra_data={})
+        return bulk_create(queryset, objs, *args, **kwargs)
+
+    monkeypatch.setattr(QuerySet, 'bulk_create', login_first)
+    counts = import_accounts(backend, records('openid1', 'openid2'))
+
+    assert counts == {'records': 2, 'users': 2, 'accounts': 1, 'existing': 1, 'skipped': 0}
+    assert socials().get(uid='openid1@qq.com').user.username == 'other'
+
+
+def test_resume_after_a_crash(backend, tmp_path):
+    path = write_jsonl(tmp_path / 'accounts.jsonl', records(*(f'openid{i}' for i in range(5))))
+    checkpoint_path = str(tmp_path / 'accounts.checkpoint')
+
+    def crash_after_first_chunk(totals, elapsed):
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        import_file(backend, path, chunk_size=2, checkpoint_path=checkpoint_path, progress=crash_after_first_chunk)
+    assert socials().count() == 2
+
+    totals = import_file(backend, path, chunk_size=2, checkpoint_path=checkpoint_path)
+
+    assert totals == {'records': 5, 'users': 5, 'accounts': 5, 'existing': 0, 'skipped': 0}
+    assert socials().count() == 5
+
+
+def test_checkpoint_of_another_file(backend, tmp_path):
+    checkpoint_path = str(tmp_path / 'accounts.checkpoint')
+    import_file(backend, write_jsonl(tmp_path / 'a.jsonl', records('openid1')), checkpoint_path=checkpoint_path)
+
+    with pytest.raises(ValueError):
+        import_file(backend, write_jsonl(tmp_path / 'b.jsonl', records('openid2')), checkpoint_path=checkpoint_path)
+
+
+def test_read_csv(tmp_path):
+    path = tmp_path / 'accounts.csv'
+    path.write_text('openid,unionid\nopenid1,union1\nopenid2,\n', encoding='utf-8')
+
+    assert list(read_records(str(path))) == [{'openid': 'openid1', 'unionid': 'union1'}, {'openid': 'openid2'}]
+    assert list(read_records(str(path), start=1)) == [{'openid': 'openid2'}]
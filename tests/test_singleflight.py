@@ -0,0 +1,138 @@
+import asyncio
+import threading
+
+import pytest
+
+from social_auth.singleflight import SingleFlight
+
+SETTINGS = {'SOCIAL_AUTH_SINGLE_FLIGHT_TTL': 30, 'SOCIAL_AUTH_SINGLE_FLIGHT_WAIT': 5}
+
+
+class Exchange:
+    """Code exchange counting its calls, held until `release` for the concurrent ones."""
+
+    def __init__(self, result='user1', error=None):
+        self.result = result
+        self.error = error
+        self.calls = 0
+        self.started = threading.Event()
+        self.released = threading.Event()
+        self.released.set()
+
+    def hold(self):
+        self.released.clear()
+
+    def __call__(self):
+        self.calls += 1
+        self.started.set()
+        self.released.wait(5)
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+@pytest.fixture
+def single_flight(cache):
+    return SingleFlight(SETTINGS)
+
+
+def test_disabled_by_default(cache):
+    exchange = Exchange()
+    single_flight = SingleFlight({})
+
+    single_flight.do('key', exchange)
+    single_flight.do('key', exchange)
+
+    assert not single_flight.enabled
+    assert exchange.calls == 2
+
+
+def test_concurrent_calls_share_one_exchange(single_flight):
+    exchange = Exchange()
+    exchange.hold()
+    results = []
+
+    def login():
+        results.append(single_flight.do('key', exchange))
+
+    threads = [threading.Thread(target=login) for _ in range(5)]
+    threads[0].start()
+    exchange.started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    exchange.released.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert exchange.calls == 1
+    assert results == ['user1'] * 5
+
+
+def test_retry_gets_the_result_of_another_process(single_flight):
+    exchange = Exchange()
+    single_flight.do('key', exchange, dump=lambda user: user.upper())
+
+    # nothing in flight in this process, the result comes from the cache
+    result = single_flight.do('key', exchange, load=lambda user: user.lower())
+
+    assert result == 'user1'
+    assert exchange.calls == 1
+
+
+def test_other_keys_are_not_shared(single_flight):
+    exchange = Exchange()
+
+    single_flight.do(single_flight.make_key('weixin-weapp', 'code1'), exchange)
+    single_flight.do(single_flight.make_key('weixin-weapp', 'code2'), exchange)
+
+    assert exchange.calls == 2
+
+
+def test_failures_are_not_shared(single_flight):
+    failing = Exchange(error=ConnectionError('provider down'))
+    with pytest.raises(ConnectionError):
+        single_flight.do('key', failing)
+
+    exchange = Exchange()
+
+    assert single_flight.do('key', exchange) == 'user1'
+    assert exchange.calls == 1
+
+
+def test_unshareable_results_are_not_cached(single_flight):
+    # e.g. a partial pipeline redirect instead of a user
+    exchange = Exchange(result='redirect')
+    single_flight.do('key', exchange, dump=lambda result: None)
+    single_flight.do('key', exchange, dump=lambda result: None)
+
+    assert exchange.calls == 2
+
+
+def test_async_calls_share_one_exchange(single_flight):
+    calls = []
+
+    async def exchange():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return 'user1'
+
+    async def logins():
+        return await asyncio.gather(*(single_flight.ado('key', exchange) for _ in range(5)))
+
+    assert asyncio.run(logins()) == ['user1'] * 5
+    assert len(calls) == 1
+
+
+def test_state_of_stateless_backends_is_not_in_the_key(single_flight):
+    from social_core.backends.github import GithubOAuth2
+
+    from social_auth.backends.weapp import WeappAuth
+    from social_auth.plugin import SocialAuthPlugin
+
+    def key(backend_class, state):
+        return SocialAuthPlugin.single_flight_key(
+            single_flight, backend_class, backend_class.name, {'code': 'code1', 'state': state},
+        )
+
+    assert key(WeappAuth, 'state1') == key(WeappAuth, 'state2') == key(WeappAuth, None)
+    assert key(GithubOAuth2, 'state1') != key(GithubOAuth2, 'state2')
@@ -0,0 +1,143 @@
+import asyncio
+import time
+from datetime import timedelta
+
+import pytest
+from django.contrib.sessions.backends.base import CreateError
+from django.contrib.sessions.models import Session
+from django.utils import timezone
+
+from social_auth.state import CacheStateStore, DBStateStore
+
+SETTINGS = {'SOCIAL_AUTH_STATE_TIMEOUT': 600}
+
+
+@pytest.fixture
+def db_store(migrated_db):
+    yield DBStateStore(SETTINGS)
+    Session.objects.all().delete()
+
+
+@pytest.fixture
+def cache_store(cache):
+    return CacheStateStore(SETTINGS)
+
+
+@pytest.fixture(params=['cache_store', 'db_store'])
+def store(request):
+    return request.getfixturevalue(request.param)
+
+
+def test_save_and_pop(store):
+    store.save('state1', {'next': '/account', 'redirect_state': 'abc'})
+
+    assert store.pop('state1') == {'next': '/account', 'redirect_state': 'abc'}
+
+
+def test_pop_is_one_time(store):
+    store.save('state1', {'next': '/account'})
+
+    assert store.pop('state1') is not None
+    assert store.pop('state1') is None
+
+
+def test_pop_missing(store):
+    assert store.pop('unknown') is None
+
+
+def test_save_taken_state(store):
+    store.save('state1', {'next': '/account'})
+
+    with pytest.raises(CreateError):
+        store.save('state1', {'next': '/other'})
+    assert store.pop('state1') == {'next': '/account'}
+
+
+def test_long_state_token(store):
+    token = 'x' * 64
+    store.save(token, {'next': '/account'})
+
+    assert store.pop(token) == {'next': '/account'}
+
+
+def test_cache_store_expiry(cache_store, monkeypatch):
+    cache_store.save('state1', {'next': '/account'})
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now + SETTINGS['SOCIAL_AUTH_STATE_TIMEOUT'] + 1)
+
+    assert cache_store.pop('state1') is None
+
+
+def test_db_store_expiry(db_store):
+    db_store.save('state1', {'next': '/account'})
+    Session.objects.filter(session_key=DBStateStore.session_key('state1')).update(
+        expire_date=timezone.now() - timedelta(seconds=1),
+    )
+
+    assert db_store.pop('state1') is None
+
+
+def test_db_store_key_prefix(db_store):
+    db_store.save('state1', {'next': '/account'})
+
+    assert Session.objects.filter(session_key='sa_state1').exists()
+
+
+def test_claim_and_delete(store):
+    store.save('state1', {'next': '/account'})
+
+    assert store.claim('state1') == {'next': '/account'}
+    store.delete('state1')
+    assert store.claim('state1') is None
+
+
+def test_claim_is_exclusive(store):
+    store.save('state1', {'next': '/account'})
+
+    assert store.claim('state1') is not None
+    assert store.claim('state1') is None
+
+
+def test_released_claim_can_be_retried(store):
+    store.save('state1', {'next': '/account'})
+    data = store.claim('state1')
+
+    # e.g. the provider answered 502
+    store.release('state1', data)
+
+    assert store.claim('state1') == {'next': '/account'}
+
+
+def test_claim_missing(store):
+    assert store.claim('unknown') is None
+
+
+def test_expired_claim_can_be_retried(store, monkeypatch):
+    store.save('state1', {'next': '/account'})
+    store.claim('state1')
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now + store.claim_timeout + 1)
+
+    assert store.claim('state1') == {'next': '/account'}
+
+
+@pytest.mark.filterwarnings('error')
+def test_cache_store_keys_of_any_state(cache_store):
+    # `CacheKeyWarning` of the keys memcached would reject
+    token = 'a state with spaces ' + 'x' * 300
+    cache_store.save(token, {'next': '/account'})
+
+    assert cache_store.claim(token) == {'next': '/account'}
+
+
+def test_cache_store_async_claim(cache_store):
+    async def exchange():
+        await cache_store.asave('state1', {'next': '/account'})
+        data = await cache_store.aclaim('state1')
+        assert await cache_store.aclaim('state1') is None
+        await cache_store.arelease('state1', data)
+        assert await cache_store.aclaim('state1') == data
+        await cache_store.adelete('state1')
+        return await cache_store.aclaim('state1')
+
+    assert asyncio.run(exchange()) is None
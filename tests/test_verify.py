@@ -0,0 +1,100 @@
+import base64
+import time
+
+import pytest
+
+from social_auth.users import GENERATION_KEY
+from social_auth.verify import MAX_CACHE_TTL, RefreshCache, VerifyCache, token_hash
+
+SETTINGS = {'SOCIAL_AUTH_VERIFY_CACHE_TTL': 60, 'SOCIAL_AUTH_REFRESH_CACHE_TTL': 60}
+
+
+@pytest.fixture(params=[VerifyCache, RefreshCache])
+def token_cache(request, user):
+    return request.param(SETTINGS)
+
+
+def payload_of(user, ttl=60):
+    return {
+        'user_id': base64.b64encode(f'User:{user.pk}'.encode('utf-8')).decode('utf-8'),
+        'email': user.email,
+        'exp': time.time() + ttl,
+    }
+
+
+def cache_token(token_cache, user, ttl=60):
+    payload = payload_of(user, ttl)
+    token_cache.set('token1', user, payload, token_cache.generation(payload))
+    return payload
+
+
+def test_cached_token(token_cache, user):
+    payload = cache_token(token_cache, user)
+
+    cached_user, cached_payload = token_cache.get('token1')
+
+    assert cached_payload == payload
+    assert (cached_user.pk, cached_user.email, cached_user.is_active) == (user.pk, user.email, True)
+
+
+def test_password_is_not_cached(token_cache, user):
+    cache_token(token_cache, user)
+
+    snapshot, _, _ = token_cache.cache.get(token_cache.key_prefix + token_hash('token1'))
+    cached_user, _ = token_cache.get('token1')
+
+    assert 'password' not in snapshot
+    assert 'password' in cached_user.get_deferred_fields()
+
+
+def test_user_change_invalidates(token_cache, user):
+    cache_token(token_cache, user)
+
+    user.is_active = False
+    user.save()
+
+    assert token_cache.get('token1') is None
+
+
+def test_user_deletion_invalidates(token_cache, user):
+    cache_token(token_cache, user)
+
+    user.delete()
+
+    assert token_cache.get('token1') is None
+
+
+def test_login_bookkeeping_keeps_the_entry(token_cache, user):
+    cache_token(token_cache, user)
+
+    user.save(update_fields=['last_login'])
+
+    assert token_cache.get('token1') is not None
+
+
+def test_change_before_the_entry_is_written(token_cache, user):
+    payload = payload_of(user)
+    generation = token_cache.generation(payload)
+    # committed by another request between the generation read and the user query
+    user.save()
+
+    token_cache.set('token1', user, payload, generation)
+
+    assert token_cache.get('token1') is None
+
+
+def test_expired_token(token_cache, user):
+    cache_token(token_cache, user, ttl=-1)
+
+    assert token_cache.get('token1') is None
+
+
+def test_ttl_is_capped(user):
+    assert VerifyCache({'SOCIAL_AUTH_VERIFY_CACHE_TTL': 3600}).max_ttl == MAX_CACHE_TTL
+
+
+def test_disabled_caches_bump_nothing(user, cache):
+    VerifyCache({})
+    user.save()
+
+    assert cache.get(GENERATION_KEY.format(user.pk)) is None
@@ -0,0 +1,96 @@
+import threading
+
+import pytest
+
+from social_auth import pipeline
+from social_auth.backends.weapp import WeappAuth
+from social_auth.pipeline import load_extra_data
+from social_auth.writebehind import WriteBehindBuffer
+
+
+@pytest.fixture
+def buffer(monkeypatch):
+    buffer = WriteBehindBuffer()
+    monkeypatch.setattr(pipeline, 'write_behind', buffer)
+    yield buffer
+    buffer.flush()
+
+
+@pytest.fixture
+def social(user):
+    from social_django.models import UserSocialAuth
+
+    return UserSocialAuth.objects.create(
+        user=user, provider='weixin-weapp', uid='openid1', extra_data={'openid': 'openid1'},
+    )
+
+
+def stored_extra_data(social):
+    return type(social).objects.get(pk=social.pk).extra_data
+
+
+def login(backend, social, response):
+    load_extra_data(backend, {}, response, social.uid, social.user, social=social)
+
+
+def test_updates_of_a_row_are_coalesced(buffer, social):
+    buffer.add(social, {'extra_data': {'openid': 'openid1', 'unionid': 'union1'}}, interval=60)
+    buffer.add(social, {'extra_data': {'openid': 'openid1', 'unionid': 'union2'}}, interval=60)
+
+    assert len(buffer) == 1
+    assert stored_extra_data(social) == {'openid': 'openid1'}
+    assert buffer.flush() == 1
+    assert stored_extra_data(social) == {'openid': 'openid1', 'unionid': 'union2'}
+
+
+def test_flushed_when_full(buffer, social, user):
+    from social_django.models import UserSocialAuth
+
+    other = UserSocialAuth.objects.create(user=user, provider='weixin-weapp', uid='openid2', extra_data={})
+    buffer.add(social, {'extra_data': {'unionid': 'union1'}}, interval=60, max_size=2)
+    buffer.add(other, {'extra_data': {'unionid': 'union2'}}, interval=60, max_size=2)
+
+    assert len(buffer) == 0
+    assert stored_extra_data(other) == {'unionid': 'union2'}
+
+
+def test_flushed_after_the_interval(buffer, social, monkeypatch):
+    flushed = threading.Event()
+    monkeypatch.setattr(buffer, 'flush', flushed.set)
+
+    buffer.add(social, {'extra_data': {}}, interval=0.01)
+
+    assert flushed.wait(5)
+
+
+def test_changed_extra_data_is_buffered(buffer, make_backend, social):
+    backend = make_backend(WeappAuth, SOCIAL_AUTH_WRITE_BEHIND=True)
+
+    login(backend, social, {'openid': 'openid1', 'unionid': 'union1'})
+
+    assert len(buffer) == 1
+    assert 'unionid' not in stored_extra_data(social)
+    buffer.flush()
+    assert stored_extra_data(social)['unionid'] == 'union1'
+
+
+def test_auth_time_alone_is_not_written(buffer, make_backend, social):
+    backend = make_backend(WeappAuth, SOCIAL_AUTH_WRITE_BEHIND=True)
+    login(backend, social, {'openid': 'openid1', 'unionid': 'union1'})
+    buffer.flush()
+
+    social.extra_data['auth_time'] -= 60
+
+    # same response, only `auth_time` differs
+    login(backend, social, {'openid': 'openid1', 'unionid': 'union1'})
+
+    assert len(buffer) == 0
+
+
+def test_without_write_behind(buffer, make_backend, social):
+    backend = make_backend(WeappAuth, SOCIAL_AUTH_WRITE_BEHIND=False)
+
+    login(backend, social, {'openid': 'openid1', 'unionid': 'union1'})
+
+    assert len(buffer) == 0
+    assert stored_extra_data(social)['unionid'] == 'union1'